@@ -0,0 +1,130 @@
+"""
+Latency and cross-process hit rate of the cache backends.
+
+Every backend gets the same rendered-page-sized values. Besides the
+per-operation timings it reports how many reads of a value written by
+one process hit in the other worker processes, which is what decides
+whether a multi-worker server renders a page once or once per worker.
+
+    python benchmarks/cache_backends.py --value-size 20000 --workers 4
+"""
+import argparse
+import multiprocessing
+import os
+import shutil
+import tempfile
+
+from utils import measure, print_table, setup_django
+
+setup_django()
+
+from django.core.cache.backends.filebased import FileBasedCache  # noqa: E402
+from django.core.cache.backends.locmem import LocMemCache  # noqa: E402
+
+from core.cache import SQLiteCache  # noqa: E402
+
+KEYS: int = 100
+
+
+def backends(directory):
+    return {
+        'locmem': lambda: LocMemCache('benchmark', {}),
+        'filebased': lambda: FileBasedCache(
+            os.path.join(directory, 'files'), {}
+        ),
+        'sqlite': lambda: SQLiteCache(
+            os.path.join(directory, 'cache.sqlite3'), {}
+        ),
+    }
+
+
+def read_all(make_cache, written, hits):
+    cache = make_cache()
+    written.wait()
+    hits.put(len(cache.get_many([f'key_{i}' for i in range(KEYS)])))
+
+
+def cross_process_hits(make_cache, value, workers):
+    """
+    Share of reads in worker processes that found the parent's writes.
+
+    Workers are forked before the writes, as a prefork server does.
+    """
+    context = multiprocessing.get_context('fork')
+    written = context.Event()
+    hits = context.Queue()
+    processes = [
+        context.Process(target=read_all, args=(make_cache, written, hits))
+        for _ in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    make_cache().set_many({f'key_{i}': value for i in range(KEYS)})
+    written.set()
+    found = sum(hits.get() for _ in processes)
+    for process in processes:
+        process.join()
+    return found / (KEYS * workers)
+
+
+def run(name, make_cache, value, repeat, workers):
+    cache = make_cache()
+    cache.clear()
+    keys = [f'key_{i}' for i in range(KEYS)]
+
+    def set_all():
+        for key in keys:
+            cache.set(key, value)
+
+    def get_all():
+        for key in keys:
+            cache.get(key)
+
+    def incr_all():
+        for _ in keys:
+            cache.incr('version')
+
+    set_us = measure(set_all, repeat=repeat) * 1000 / KEYS
+    get_us = measure(get_all, repeat=repeat) * 1000 / KEYS
+    get_many_us = measure(lambda: cache.get_many(keys), repeat=repeat) * 1000
+    cache.set('version', 0, timeout=None)
+    incr_us = measure(incr_all, repeat=repeat) * 1000 / KEYS
+    cache.clear()
+    hit_rate = cross_process_hits(make_cache, value, workers)
+    return [
+        name,
+        f'{set_us:.1f}',
+        f'{get_us:.1f}',
+        f'{get_many_us:.1f}',
+        f'{incr_us:.1f}',
+        f'{hit_rate:.0%}',
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--value-size', type=int, default=20000)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args()
+    value = 'x' * args.value_size
+    directory = tempfile.mkdtemp()
+    try:
+        rows = [
+            run(name, make_cache, value, args.repeat, args.workers)
+            for name, make_cache in backends(directory).items()
+        ]
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    print(f'{KEYS} keys of {args.value_size} bytes, {args.workers} workers')
+    print_table(
+        [
+            'backend', 'set us', 'get us', f'get_many({KEYS}) us',
+            'incr us', 'cross-process hits',
+        ],
+        rows,
+    )
+
+
+if __name__ == '__main__':
+    main()
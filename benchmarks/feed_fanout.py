@@ -0,0 +1,91 @@
+"""
+Write amplification and read latency of the hybrid follow feed.
+
+For authors on both sides of FEED_PULL_THRESHOLD it reports how many
+timeline rows one new post writes, how long the write takes and how
+long the first page of /follow/ takes for one of the followers.
+
+    python benchmarks/feed_fanout.py --followers 10 100 1000 --threshold 500
+"""
+import argparse
+
+from utils import measure, print_table, setup_django, test_database
+
+setup_django()
+
+from django.db import connection  # noqa: E402
+from django.test import Client, override_settings  # noqa: E402
+from django.test.utils import CaptureQueriesContext  # noqa: E402
+
+from posts import counters, timeline  # noqa: E402
+from posts.models import Follow, Post, TimelineEntry, User  # noqa: E402
+
+
+def make_author(name, followers):
+    author = User.objects.create(username=name)
+    User.objects.bulk_create(
+        User(username=f'{name}_follower_{i}') for i in range(followers)
+    )
+    users = list(User.objects.filter(username__startswith=f'{name}_'))
+    Follow.objects.bulk_create(
+        Follow(user=user, author=author) for user in users
+    )
+    # bulk_create sends no signals, update_mode reads the counters
+    counters.reconcile_users(User.objects.filter(id=author.id))
+    timeline.update_mode(author.id)
+    return author, users[0]
+
+
+def run(followers, posts, repeat):
+    author, reader = make_author(f'author_{followers}', followers)
+    mode = 'pull' if timeline.is_pulled(author.id) else 'push'
+    rows_before = TimelineEntry.objects.count()
+
+    def write():
+        Post.objects.create(text='Benchmark post', author=author)
+
+    write_ms = measure(write, repeat=posts)
+    rows = (TimelineEntry.objects.count() - rows_before) / posts
+    client = Client()
+    client.force_login(reader)
+    read_ms = measure(lambda: client.get('/follow/'), repeat=repeat)
+    with CaptureQueriesContext(connection) as queries:
+        client.get('/follow/')
+    return [
+        followers,
+        mode,
+        f'{rows:.0f}',
+        f'{write_ms:.2f}',
+        f'{read_ms:.2f}',
+        len(queries),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        '--followers', nargs='+', type=int, default=[10, 100, 1000, 5000]
+    )
+    parser.add_argument('--threshold', type=int, default=500)
+    parser.add_argument('--posts', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+    with test_database(), override_settings(
+        FEED_PULL_THRESHOLD=args.threshold
+    ):
+        rows = [
+            run(followers, args.posts, args.repeat)
+            for followers in args.followers
+        ]
+    print(f'FEED_PULL_THRESHOLD={args.threshold}')
+    print_table(
+        [
+            'followers', 'mode', 'rows/post',
+            'write ms', 'read ms', 'read queries',
+        ],
+        rows,
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,145 @@
+"""
+Cost of the page navigation on a deep page of a large feed.
+
+The feed is paged the way it was at first, by page number with a link
+to every page, and the way it is now, by cursor with a window around
+the current page. For each it reports how long the page takes to
+fetch, how long the navigation takes to render and how many bytes it
+adds to the page.
+
+    python benchmarks/paginator.py --posts 100000 --page 5000
+"""
+import argparse
+
+from utils import measure, print_table, setup_django, test_database
+
+setup_django()
+
+from django.core.paginator import Paginator  # noqa: E402
+from django.template import Context, Template  # noqa: E402
+from django.template.loader import get_template  # noqa: E402
+
+from posts.models import Post, User  # noqa: E402
+from posts.paginators import CursorPaginator, encode_cursor  # noqa: E402
+from posts.views import NUMBER_OF_DISPLAYED_ITEMS  # noqa: E402
+
+# includes/paginator.html before cursor pagination
+NUMBERED_TEMPLATE = Template('''
+{% if page_obj.has_other_pages %}
+<nav aria-label="Page navigation" class="my-5">
+  <ul class="pagination">
+    {% if page_obj.has_previous %}
+      <li class="page-item"><a class="page-link" href="?page=1">First</a></li>
+      <li class="page-item">
+        <a class="page-link" href="?page={{ page_obj.previous_page_number }}">
+          Previous
+        </a>
+      </li>
+    {% endif %}
+    {% for i in page_obj.paginator.page_range %}
+        {% if page_obj.number == i %}
+          <li class="page-item active">
+            <span class="page-link">{{ i }}</span>
+          </li>
+        {% else %}
+          <li class="page-item">
+            <a class="page-link" href="?page={{ i }}">{{ i }}</a>
+          </li>
+        {% endif %}
+    {% endfor %}
+    {% if page_obj.has_next %}
+      <li class="page-item">
+        <a class="page-link" href="?page={{ page_obj.next_page_number }}">
+          Next
+        </a>
+      </li>
+      <li class="page-item">
+        <a class="page-link" href="?page={{ page_obj.paginator.num_pages }}">
+          Last
+        </a>
+      </li>
+    {% endif %}
+  </ul>
+</nav>
+{% endif %}
+''')
+
+
+def make_posts(count, batch_size=400):
+    author = User.objects.create(username='author')
+    Post.objects.bulk_create(
+        (Post(text=f'Benchmark post {i}', author=author)
+         for i in range(count)),
+        batch_size=batch_size,
+    )
+
+
+def posts():
+    return Post.objects.select_related('author', 'group').order_by(
+        '-pub_date', '-id'
+    )
+
+
+def numbered(number):
+    def page():
+        page_obj = Paginator(posts(), NUMBER_OF_DISPLAYED_ITEMS).page(number)
+        list(page_obj)
+        return page_obj
+
+    def render(page_obj):
+        return NUMBERED_TEMPLATE.render(Context({'page_obj': page_obj}))
+    return page, render
+
+
+def windowed(number):
+    # The cursor the "Next" link of the page before would carry
+    last = posts()[(number - 1) * NUMBER_OF_DISPLAYED_ITEMS - 1]
+    cursor = encode_cursor(last.pub_date, last.id, number)
+    template = get_template('includes/paginator.html')
+
+    def page():
+        paginator = CursorPaginator(posts(), NUMBER_OF_DISPLAYED_ITEMS)
+        return paginator.get_page(cursor)
+
+    def render(page_obj):
+        return template.render({'page_obj': page_obj})
+    return page, render
+
+
+def run(name, paging, number, repeat):
+    page, render = paging(number)
+    page_obj = page()
+    assert page_obj.number == number, page_obj.number
+    html = render(page_obj)
+    return [
+        name,
+        f'{measure(page, repeat=repeat):.2f}',
+        f'{measure(lambda: render(page_obj), repeat=repeat):.2f}',
+        len(html.encode()),
+        html.count('<li'),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--posts', type=int, default=100_000)
+    parser.add_argument('--page', type=int, default=5000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+    with test_database():
+        make_posts(args.posts)
+        rows = [
+            run(name, paging, args.page, args.repeat)
+            for name, paging in (
+                ('numbered', numbered),
+                ('windowed', windowed),
+            )
+        ]
+    print(f'posts={args.posts} page={args.page}')
+    print_table(
+        ['navigation', 'page ms', 'render ms', 'bytes', 'items'], rows
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+"""
+Database load of the index page across a cache expiry boundary.
+
+Client threads request the index page in a loop, cached with a
+timeout that runs out halfway through. The script prints the SQL
+queries run in each time slice, for the single-flight cache, which
+refreshes the page a little early (XFetch) while serving the old copy,
+and for plain cache_page, which every client misses at the same moment.
+
+    python benchmarks/stampede.py --clients 16 --seconds 4
+"""
+import argparse
+import inspect
+import threading
+import time
+from collections import Counter
+
+from utils import print_table, setup_django, test_database
+
+setup_django()
+
+from django.contrib.auth.models import AnonymousUser  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.test import RequestFactory  # noqa: E402
+from django.views.decorators.cache import cache_page  # noqa: E402
+
+from posts import caching, views  # noqa: E402
+from posts.models import Group, Post, User  # noqa: E402
+
+SLICE: float = 0.1
+
+
+def single_flight(timeout):
+    """Cache a view as views.index is cached, with another timeout."""
+    return caching.cache_page_versioned(
+        timeout,
+        key_prefix='index',
+        scopes=views.index_scopes,
+        background_refresh=True,
+    )
+
+
+def plain_cache_page(timeout):
+    """Cache a view as the index was before, the version in the key."""
+    def decorator(view):
+        def wrapper(request):
+            version = caching.versions([caching.FEED])
+            return cache_page(timeout, key_prefix=f'plain:{version}')(view)(
+                request
+            )
+        return wrapper
+    return decorator
+
+
+def load(cached, view, clients, seconds):
+    """
+    Queries run per time slice by clients requesting cached(view).
+
+    They are counted in the view, so that the renders of the refresh
+    pool threads count too.
+    """
+    queries = Counter()
+    lock = threading.Lock()
+    start = time.monotonic()
+    stop = start + seconds
+
+    def count(execute, sql, params, many, context):
+        with lock:
+            queries[int((time.monotonic() - start) / SLICE)] += 1
+        return execute(sql, params, many, context)
+
+    def counted(request):
+        with connection.execute_wrapper(count):
+            return view(request)
+
+    cached_view = cached(counted)
+
+    def client():
+        factory = RequestFactory()
+        while time.monotonic() < stop:
+            request = factory.get('/')
+            request.user = AnonymousUser()
+            cached_view(request)
+        connection.close()
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return queries
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--seconds', type=float, default=4.0)
+    parser.add_argument('--posts', type=int, default=1000)
+    args = parser.parse_args()
+    with test_database():
+        author = User.objects.create(username='author')
+        group = Group.objects.create(title='Group', slug='group')
+        Post.objects.bulk_create(
+            Post(text=f'Post {i}', author=author, group=group)
+            for i in range(args.posts)
+        )
+        # The view without the caching and ETag decorators of views.py
+        raw_index = inspect.unwrap(views.index)
+        timeout = args.seconds / 2
+        results = {}
+        for name, cached in (
+            ('single-flight', single_flight(timeout)),
+            ('cache_page', plain_cache_page(timeout)),
+        ):
+            caching.cache.clear()
+            results[name] = load(
+                cached, raw_index, args.clients, args.seconds
+            )
+    slices = range(int(args.seconds / SLICE) + 1)
+    counts = list(results.values())
+    print(
+        f'{args.clients} clients, pages cached for '
+        f'{args.seconds / 2:.1f}s, queries per {SLICE}s slice'
+    )
+    print_table(
+        ['slice', *results],
+        [
+            [f'{i * SLICE:.1f}s', *(queries[i] for queries in counts)]
+            for i in slices
+        ],
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+"""
+Bytes and requests spent on static assets per page view.
+
+The index page is rendered with plain static files, as served before,
+and with the hashed, precompressed files of collectstatic. Each asset
+it links to is then fetched the way a browser would: once on the first
+view, and on a later view either revalidated or, when the first
+response is fresh for that long, not requested at all.
+
+    python benchmarks/static_assets.py --revisit-after 3600
+"""
+import argparse
+import re
+import shutil
+import tempfile
+
+from utils import print_table, setup_django, test_database
+
+setup_django()
+
+from django.conf import settings  # noqa: E402
+from django.core.cache import cache  # noqa: E402
+from django.core.management import call_command  # noqa: E402
+from django.test import Client, RequestFactory  # noqa: E402
+from django.test.utils import override_settings  # noqa: E402
+from django.utils.cache import get_max_age  # noqa: E402
+from django.views import static  # noqa: E402
+
+from core import staticfiles  # noqa: E402
+from posts.models import Post, User  # noqa: E402
+
+ACCEPT_ENCODING: str = 'gzip, deflate, br'
+FINDERS = ['django.contrib.staticfiles.finders.FileSystemFinder']
+
+
+def asset_paths(html):
+    """Paths under STATIC_URL linked from the page, in order."""
+    pattern = re.escape(settings.STATIC_URL) + r'([^"\'\s>]+)'
+    return list(dict.fromkeys(re.findall(pattern, html)))
+
+
+def fetch(serve, path, **headers):
+    request = RequestFactory().get(
+        settings.STATIC_URL + path,
+        HTTP_ACCEPT_ENCODING=ACCEPT_ENCODING,
+        **headers,
+    )
+    response = serve(request, path)
+    body = b''.join(response) if response.streaming else response.content
+    response.close()
+    return response, len(body)
+
+
+def page_view_costs(serve, paths, revisit_after):
+    """(requests, bytes) of the first view and of a later one."""
+    first_bytes = repeat_requests = repeat_bytes = 0
+    for path in paths:
+        response, size = fetch(serve, path)
+        first_bytes += size
+        if (get_max_age(response) or 0) >= revisit_after:
+            continue
+        repeat_requests += 1
+        _, size = fetch(
+            serve, path, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']
+        )
+        repeat_bytes += size
+    return len(paths), first_bytes, repeat_requests, repeat_bytes
+
+
+def index_html():
+    # The cached page still links to the files of the other run
+    cache.clear()
+    response = Client().get('/')
+    return response.content.decode()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        '--revisit-after',
+        type=int,
+        default=60 * 60,
+        help='Seconds between the first and the later page view.',
+    )
+    args = parser.parse_args()
+    static_root = tempfile.mkdtemp()
+    try:
+        with test_database():
+            author = User.objects.create(username='author')
+            Post.objects.create(text='Post', author=author)
+            rows = []
+            # Under DEBUG {% static %} leaves names unhashed
+            with override_settings(
+                DEBUG=False,
+                STATICFILES_STORAGE=(
+                    'django.contrib.staticfiles.storage.StaticFilesStorage'
+                ),
+            ):
+                paths = asset_paths(index_html())
+
+                def plain_serve(request, path):
+                    return static.serve(
+                        request, path, settings.STATICFILES_DIRS[0]
+                    )
+
+                rows.append((
+                    'plain',
+                    *page_view_costs(plain_serve, paths, args.revisit_after),
+                ))
+            with override_settings(
+                DEBUG=False,
+                STATIC_ROOT=static_root,
+                STATICFILES_FINDERS=FINDERS,
+            ):
+                call_command('collectstatic', interactive=False, verbosity=0)
+                paths = asset_paths(index_html())
+                rows.append((
+                    'hashed+compressed',
+                    *page_view_costs(
+                        staticfiles.serve, paths, args.revisit_after
+                    ),
+                ))
+    finally:
+        shutil.rmtree(static_root, ignore_errors=True)
+    print(
+        f'Static assets of the index page, later view after '
+        f'{args.revisit_after}s, Accept-Encoding: {ACCEPT_ENCODING}'
+    )
+    print_table(
+        [
+            'assets', 'first requests', 'first bytes',
+            'later requests', 'later bytes',
+        ],
+        rows,
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,11 @@
+import pytest
+
+pytest_plugins = ['posts.tests.fixtures']
+
+
+@pytest.fixture(autouse=True, scope='session')
+def temporary_cache():
+    """Keep the tests away from the developer's cache file."""
+    from yatube.test_runner import temporary_cache
+    with temporary_cache():
+        yield
@@ -0,0 +1,281 @@
+"""
+Cache backend shared by all worker processes of one host.
+
+Entries live in a SQLite file in WAL mode, so readers never block each
+other and a write made by one worker is seen by the rest at once. The
+file is kept under a byte budget by evicting the least recently used
+entries.
+
+    CACHES = {
+        'default': {
+            'BACKEND': 'core.cache.SQLiteCache',
+            'LOCATION': '/var/tmp/yatube-cache.sqlite3',
+            'OPTIONS': {'MAX_BYTES': 64 * 1024 * 1024},
+        }
+    }
+"""
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+MAX_BYTES: int = 64 * 1024 * 1024
+# Share of the budget left filled after an eviction, so that a full
+# cache does not evict again on every following set
+LOW_WATER: float = 0.9
+# Reads move an entry up the LRU order at most this often, in seconds
+ACCESS_RESOLUTION: float = 1.0
+BUSY_TIMEOUT_MS: int = 5000
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    expires REAL,
+    accessed REAL NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS entries_accessed_idx ON entries (accessed);
+CREATE TABLE IF NOT EXISTS total (
+    id INTEGER PRIMARY KEY CHECK (id = 0),
+    size INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO total (id, size) VALUES (0, 0);
+CREATE TRIGGER IF NOT EXISTS entries_insert AFTER INSERT ON entries
+BEGIN
+    UPDATE total SET size = size + NEW.size;
+END;
+CREATE TRIGGER IF NOT EXISTS entries_update AFTER UPDATE OF size ON entries
+BEGIN
+    UPDATE total SET size = size + NEW.size - OLD.size;
+END;
+CREATE TRIGGER IF NOT EXISTS entries_delete AFTER DELETE ON entries
+BEGIN
+    UPDATE total SET size = size - OLD.size;
+END;
+'''
+
+UPSERT = '''
+INSERT INTO entries (key, value, size, expires, accessed)
+VALUES (?, ?, ?, ?, ?)
+ON CONFLICT (key) DO UPDATE SET
+    value = excluded.value,
+    size = excluded.size,
+    expires = excluded.expires,
+    accessed = excluded.accessed
+'''
+
+EVICT = '''
+DELETE FROM entries WHERE key IN (
+    SELECT key FROM (
+        SELECT key, size, SUM(size) OVER (ORDER BY accessed, key) AS running
+        FROM entries
+    ) WHERE running - size < ?
+)
+'''
+
+
+class SQLiteCache(BaseCache):
+    """LRU cache with a byte budget, stored in one SQLite file."""
+
+    pickle_protocol = pickle.HIGHEST_PROTOCOL
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        self._path = location
+        options = params.get('OPTIONS', {})
+        self._max_bytes = int(options.get('MAX_BYTES', MAX_BYTES))
+        self._local = threading.local()
+
+    @property
+    def _db(self):
+        # Connections are kept per thread and reopened after a fork,
+        # a SQLite handle must never cross either boundary
+        pid = os.getpid()
+        if getattr(self._local, 'pid', None) != pid:
+            self._local.pid = pid
+            self._local.db = self._connect()
+        return self._local.db
+
+    def _connect(self):
+        directory = os.path.dirname(self._path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        db = sqlite3.connect(
+            self._path,
+            timeout=BUSY_TIMEOUT_MS / 1000,
+            isolation_level=None,
+            check_same_thread=False,
+        )
+        db.execute('PRAGMA journal_mode=WAL')
+        db.execute('PRAGMA synchronous=NORMAL')
+        db.executescript(SCHEMA)
+        return db
+
+    @contextmanager
+    def _write(self):
+        """Transaction holding the write lock from its first statement."""
+        db = self._db
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            yield db
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+        db.execute('COMMIT')
+
+    def _key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    def _dump(self, value):
+        return pickle.dumps(value, self.pickle_protocol)
+
+    def _expires(self, timeout):
+        if timeout is DEFAULT_TIMEOUT:
+            timeout = self.default_timeout
+        if timeout is None:
+            return None
+        return time.time() + timeout if timeout > 0 else -1
+
+    def _fetch(self, keys):
+        """Return live values of keys and refresh their place in the LRU."""
+        if not keys:
+            return {}
+        now = time.time()
+        rows = self._db.execute(
+            'SELECT key, value, accessed FROM entries '
+            f'WHERE key IN ({", ".join("?" * len(keys))}) '
+            'AND (expires IS NULL OR expires > ?)',
+            [*keys, now],
+        ).fetchall()
+        stale = [key for key, _, accessed in rows
+                 if now - accessed >= ACCESS_RESOLUTION]
+        if stale:
+            self._db.execute(
+                'UPDATE entries SET accessed = ? '
+                f'WHERE key IN ({", ".join("?" * len(stale))})',
+                [now, *stale],
+            )
+        return {key: pickle.loads(value) for key, value, _ in rows}
+
+    def _store(self, db, key, value, timeout):
+        data = self._dump(value)
+        db.execute(
+            UPSERT, (key, data, len(data), self._expires(timeout), time.time())
+        )
+
+    def _evict(self, db):
+        used = db.execute('SELECT size FROM total').fetchone()[0]
+        if used <= self._max_bytes:
+            return
+        db.execute(
+            'DELETE FROM entries WHERE expires IS NOT NULL AND expires <= ?',
+            (time.time(),),
+        )
+        used = db.execute('SELECT size FROM total').fetchone()[0]
+        target = int(self._max_bytes * LOW_WATER)
+        if used > target:
+            db.execute(EVICT, (used - target,))
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        with self._write() as db:
+            db.execute(
+                'DELETE FROM entries WHERE key = ? AND expires <= ?',
+                (key, time.time()),
+            )
+            if db.execute(
+                'SELECT 1 FROM entries WHERE key = ?', (key,)
+            ).fetchone():
+                return False
+            self._store(db, key, value, timeout)
+            self._evict(db)
+        return True
+
+    def get(self, key, default=None, version=None):
+        key = self._key(key, version)
+        return self._fetch([key]).get(key, default)
+
+    def get_many(self, keys, version=None):
+        keys = {self._key(key, version): key for key in keys}
+        return {
+            keys[key]: value
+            for key, value in self._fetch(list(keys)).items()
+        }
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        with self._write() as db:
+            self._store(db, key, value, timeout)
+            self._evict(db)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        with self._write() as db:
+            for key, value in data.items():
+                self._store(db, self._key(key, version), value, timeout)
+            self._evict(db)
+        return []
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        with self._write() as db:
+            touched = db.execute(
+                'UPDATE entries SET expires = ?, accessed = ? WHERE key = ? '
+                'AND (expires IS NULL OR expires > ?)',
+                (self._expires(timeout), time.time(), key, time.time()),
+            ).rowcount
+        return bool(touched)
+
+    def incr(self, key, delta=1, version=None):
+        key = self._key(key, version)
+        with self._write() as db:
+            row = db.execute(
+                'SELECT value FROM entries WHERE key = ? '
+                'AND (expires IS NULL OR expires > ?)',
+                (key, time.time()),
+            ).fetchone()
+            if row is None:
+                raise ValueError(f"Key '{key}' not found")
+            value = pickle.loads(row[0]) + delta
+            data = self._dump(value)
+            db.execute(
+                'UPDATE entries SET value = ?, size = ? WHERE key = ?',
+                (data, len(data), key),
+            )
+        return value
+
+    def has_key(self, key, version=None):
+        key = self._key(key, version)
+        return self._db.execute(
+            'SELECT 1 FROM entries WHERE key = ? '
+            'AND (expires IS NULL OR expires > ?)',
+            (key, time.time()),
+        ).fetchone() is not None
+
+    def delete(self, key, version=None):
+        self.delete_many([key], version=version)
+
+    def delete_many(self, keys, version=None):
+        keys = [self._key(key, version) for key in keys]
+        if not keys:
+            return
+        with self._write() as db:
+            db.execute(
+                'DELETE FROM entries '
+                f'WHERE key IN ({", ".join("?" * len(keys))})',
+                keys,
+            )
+
+    def clear(self):
+        with self._write() as db:
+            db.execute('DELETE FROM entries')
+
+    def close(self, **kwargs):
+        # Connections are reused across requests, like the DB cache does
+        pass
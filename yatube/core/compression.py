@@ -0,0 +1,203 @@
+"""
+Response compression negotiated from Accept-Encoding.
+
+CompressionMiddleware compresses text responses with brotli, when the
+package is installed, or gzip. Small responses, ranges and responses
+that already have a Content-Encoding are sent as they are. Streaming
+responses are compressed chunk by chunk, flushing after each one so
+that nothing is held back.
+
+Pages from the page cache (see posts.caching) are compressed once: the
+text between their holes (see core.holes) is stored as raw deflate
+blocks next to the cached response. A request then only deflates the
+HTML filling its holes and splices it between those blocks, which
+makes a valid gzip body for the cost of a CRC over the page.
+
+CSRF tokens are masked anew for every response, which keeps them out
+of reach of compression side channels such as BREACH.
+"""
+import struct
+import zlib
+
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+
+from . import holes
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Bodies shorter than this gain too little to be worth the CPU
+MIN_SIZE: int = 1024
+GZIP_LEVEL: int = 6
+BROTLI_QUALITY: int = 5
+COMPRESSIBLE_TYPES = (
+    'text/',
+    'application/javascript',
+    'application/json',
+    'application/xml',
+    'image/svg+xml',
+)
+# gzip header: deflate, no flags, no mtime, unknown OS
+GZIP_HEADER: bytes = b'\x1f\x8b\x08\x00\x00\x00\x00\x00\x00\xff'
+# An empty final deflate block, closing spliced blocks
+FINAL_BLOCK: bytes = b'\x03\x00'
+
+
+def accepted(request):
+    """Content codings the request accepts, q=0 ones left out."""
+    weights = {}
+    for item in request.META.get('HTTP_ACCEPT_ENCODING', '').split(','):
+        coding, _, params = item.partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        weight = 1.0
+        name, _, value = params.partition('=')
+        if name.strip().lower() == 'q':
+            try:
+                weight = float(value)
+            except ValueError:
+                weight = 0.0
+        weights[coding] = weight
+    codings = {coding for coding, weight in weights.items() if weight > 0}
+    if '*' in codings:
+        codings |= {
+            coding for coding in ('br', 'gzip') if coding not in weights
+        }
+    return codings
+
+
+def encodings():
+    """Content codings this server can produce, preferred first."""
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def deflate(data):
+    """
+    Raw deflate blocks of data that can be spliced with others.
+
+    Each call starts a fresh stream, so the blocks refer to nothing
+    before them, and a full flush leaves them byte aligned and not
+    final.
+    """
+    compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, -zlib.MAX_WBITS)
+    return compressor.compress(data) + compressor.flush(zlib.Z_FULL_FLUSH)
+
+
+def gzip_trailer(data):
+    return struct.pack(
+        '<II', zlib.crc32(data) & 0xffffffff, len(data) & 0xffffffff
+    )
+
+
+def precompress(response):
+    """Deflate the text between the holes of a page about to be cached."""
+    content = response.content.decode(response.charset)
+    # split() puts the two groups of each marker between the texts
+    texts = holes.MARKER.split(content)[::3]
+    response.deflated_texts = [
+        deflate(text.encode(response.charset)) for text in texts
+    ]
+
+
+def spliced_gzip(response):
+    """
+    gzip body of a precompressed page whose holes are filled, or None.
+
+    The cached blocks are used only if the holes filled are the ones
+    they were split at.
+    """
+    texts = getattr(response, 'deflated_texts', None)
+    filled = getattr(response, 'filled_holes', None)
+    if texts is None or filled is None or len(texts) != len(filled) + 1:
+        return None
+    parts = [GZIP_HEADER, texts[0]]
+    for html, text in zip(filled, texts[1:]):
+        parts.append(deflate(html.encode(response.charset)))
+        parts.append(text)
+    parts.append(FINAL_BLOCK)
+    parts.append(gzip_trailer(response.content))
+    return b''.join(parts)
+
+
+def compressor(encoding):
+    """(compress, flush, finish) functions of a stream in encoding."""
+    if encoding == 'br':
+        stream = brotli.Compressor(quality=BROTLI_QUALITY)
+        return stream.process, stream.flush, stream.finish
+    stream = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    return (
+        stream.compress,
+        lambda: stream.flush(zlib.Z_SYNC_FLUSH),
+        stream.flush,
+    )
+
+
+def compress(content, encoding):
+    compress_data, _, finish = compressor(encoding)
+    return compress_data(content) + finish()
+
+
+def compress_stream(chunks, encoding):
+    """Compress chunks one by one, each sent as soon as it is read."""
+    compress_chunk, flush, finish = compressor(encoding)
+    for chunk in chunks:
+        data = compress_chunk(chunk) + flush()
+        if data:
+            yield data
+    yield finish()
+
+
+def _compressible(response):
+    content_type = response.get('Content-Type', '').lower()
+    return (
+        response.status_code == 200
+        and not response.has_header('Content-Encoding')
+        and not response.has_header('Content-Range')
+        and 'no-transform' not in response.get('Cache-Control', '')
+        and content_type.startswith(COMPRESSIBLE_TYPES)
+    )
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    """Compress responses with the best coding the client accepts."""
+
+    def process_response(self, request, response):
+        if not _compressible(response):
+            return response
+        if not response.streaming and len(response.content) < MIN_SIZE:
+            return response
+        patch_vary_headers(response, ('Accept-Encoding',))
+        codings = accepted(request)
+        spliced = None
+        if 'gzip' in codings and not response.streaming:
+            # Cached blocks beat compressing the whole page anew
+            spliced = spliced_gzip(response)
+        if spliced is not None:
+            encoding = 'gzip'
+        else:
+            encoding = next(
+                (coding for coding in encodings() if coding in codings), None
+            )
+        if encoding is None:
+            return response
+        if response.streaming:
+            response.streaming_content = compress_stream(
+                response.streaming_content, encoding
+            )
+            del response['Content-Length']
+        else:
+            compressed = spliced or compress(response.content, encoding)
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response['Content-Length'] = str(len(compressed))
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            # The compressed body is not byte for byte the one tagged
+            response['ETag'] = 'W/' + etag
+        response['Content-Encoding'] = encoding
+        return response
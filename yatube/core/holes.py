@@ -0,0 +1,63 @@
+"""
+Personalized holes punched into pages shared by all users.
+
+A page cached for everyone is rendered with a marker in place of each
+personalized fragment, such as the header with the user's name. The
+markers are filled for the current user every time the page is sent,
+so one cached body serves every visitor.
+
+    {% load holes %}
+    {% hole 'follow_button' author.username %}
+"""
+import re
+from urllib.parse import quote, unquote
+
+from django.template.loader import render_to_string
+
+FILLERS = {}
+
+MARKER = re.compile(r'<!--hole:([\w-]+)((?::[^:>]*)*)-->')
+
+
+def register(name):
+    """Register func(request, *args) returning the HTML of a hole."""
+    def decorator(func):
+        FILLERS[name] = func
+        return func
+    return decorator
+
+
+def punch(request):
+    """Render holes of this request's page as markers, not as HTML."""
+    request.punch_holes = True
+
+
+def render_hole(request, name, *args):
+    """HTML of a hole, or its marker while the page is rendered shared."""
+    if getattr(request, 'punch_holes', False):
+        encoded = ''.join(f':{quote(str(arg), safe="")}' for arg in args)
+        return f'<!--hole:{name}{encoded}-->'
+    return FILLERS[name](request, *args)
+
+
+def fill(request, response):
+    """Replace the markers in a response with the user's fragments."""
+    content = response.content.decode(response.charset)
+    fragments = []
+
+    def replace(match):
+        args = [unquote(arg) for arg in match.group(2).split(':')[1:]]
+        fragments.append(FILLERS[match.group(1)](request, *args))
+        return fragments[-1]
+
+    filled = MARKER.sub(replace, content)
+    # In order, for core.compression to splice into precompressed text
+    response.filled_holes = fragments
+    if filled != content:
+        response.content = filled.encode(response.charset)
+    return response
+
+
+@register('header')
+def header(request):
+    return render_to_string('includes/header.html', request=request)
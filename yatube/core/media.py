@@ -0,0 +1,181 @@
+"""
+Serving of uploaded media for when no front server maps MEDIA_URL.
+
+With MEDIA_SENDFILE set the view only checks the request and hands the
+file over to the front server in a header, X-Sendfile for Apache or
+lighttpd and X-Accel-Redirect for nginx:
+
+    location /protected-media/ {
+        internal;
+        alias /path/to/media/;
+    }
+
+Otherwise the file is returned in a FileResponse, which the WSGI
+server sends with sendfile() through wsgi.file_wrapper, and a single
+byte range is answered with 206 Partial Content.
+
+Files named by a hash of their content, post images and thumbnails,
+never change, so browsers are told to keep them for a year without
+revalidating.
+"""
+import mimetypes
+import os
+import re
+from email.utils import formatdate
+from stat import S_ISREG
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import (FileResponse, Http404, HttpResponse,
+                         HttpResponseNotModified)
+from django.utils._os import safe_join
+from django.utils.cache import patch_cache_control
+from django.utils.encoding import escape_uri_path
+from django.views.decorators.http import require_safe
+from django.views.static import was_modified_since
+
+ACCEL_REDIRECT: str = 'x-accel-redirect'
+IMMUTABLE_MAX_AGE: int = 60 * 60 * 24 * 365
+MAX_AGE: int = 60 * 60
+# A sha256 or md5 hex digest as the file name, see core.storage
+HASHED_NAME = re.compile(r'(?:^|/)(?:[0-9a-f]{64}|[0-9a-f]{32})\.\w+$')
+RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class FileSlice:
+    """File object reading at most length bytes from where it is."""
+
+    def __init__(self, file_, length):
+        self.file = file_
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+def byte_range(header, size):
+    """
+    (first, last) byte of a Range header, None to send the whole file.
+
+    Raise ValueError for a range outside the file. Lists of ranges are
+    answered with the whole file, as RFC 7233 allows.
+    """
+    match = RANGE.match(header.strip()) if header else None
+    if match is None:
+        return None
+    first, last = match.groups()
+    if not first:
+        if not last:
+            return None
+        # A suffix: the last bytes of the file
+        first, last = max(size - int(last), 0), size - 1
+    else:
+        first = int(first)
+        last = min(int(last), size - 1) if last else size - 1
+    if first > last or first >= size:
+        raise ValueError(header)
+    return first, last
+
+
+def _last_modified(stat):
+    return formatdate(stat.st_mtime, usegmt=True)
+
+
+def _sendfile(full_path, path, content_type):
+    response = HttpResponse(content_type=content_type)
+    if settings.MEDIA_SENDFILE == ACCEL_REDIRECT:
+        response['X-Accel-Redirect'] = escape_uri_path(
+            settings.MEDIA_ACCEL_PREFIX + path
+        )
+    else:
+        response['X-Sendfile'] = full_path
+    return response
+
+
+def _file_response(request, full_path, stat, content_type):
+    try:
+        span = byte_range(request.META.get('HTTP_RANGE'), stat.st_size)
+    except ValueError:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{stat.st_size}'
+        return response
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if span is None or if_range and if_range != _last_modified(stat):
+        response = FileResponse(
+            open(full_path, 'rb'), content_type=content_type
+        )
+    else:
+        first, last = span
+        file_ = open(full_path, 'rb')
+        file_.seek(first)
+        response = FileResponse(
+            FileSlice(file_, last - first + 1),
+            content_type=content_type,
+            status=206,
+        )
+        response['Content-Length'] = last - first + 1
+        response['Content-Range'] = f'bytes {first}-{last}/{stat.st_size}'
+    response['Accept-Ranges'] = 'bytes'
+    return response
+
+
+def serve_file(request, root, path, send, immutable=False):
+    """
+    Answer a request for the file at path under root.
+
+    Raise Http404 unless it is a regular file. When the browser's copy
+    is out of date, send(full_path, stat, content_type) makes the
+    response. Files that never change are cached for a year.
+    """
+    try:
+        full_path = safe_join(root, path)
+    except SuspiciousFileOperation:
+        raise Http404(path)
+    try:
+        stat = os.stat(full_path)
+    except OSError:
+        raise Http404(path)
+    if not S_ISREG(stat.st_mode):
+        raise Http404(path)
+    if not was_modified_since(
+        request.META.get('HTTP_IF_MODIFIED_SINCE'),
+        stat.st_mtime,
+        stat.st_size,
+    ):
+        response = HttpResponseNotModified()
+    else:
+        content_type = (
+            mimetypes.guess_type(full_path)[0] or 'application/octet-stream'
+        )
+        response = send(full_path, stat, content_type)
+    response['Last-Modified'] = _last_modified(stat)
+    if immutable:
+        patch_cache_control(
+            response, public=True, max_age=IMMUTABLE_MAX_AGE, immutable=True
+        )
+    else:
+        patch_cache_control(response, public=True, max_age=MAX_AGE)
+    return response
+
+
+@require_safe
+def serve(request, path):
+    """Send the media file at path, or let the front server send it."""
+    def send(full_path, stat, content_type):
+        if settings.MEDIA_SENDFILE:
+            return _sendfile(full_path, path, content_type)
+        return _file_response(request, full_path, stat, content_type)
+    return serve_file(
+        request,
+        settings.MEDIA_ROOT,
+        path,
+        send,
+        immutable=bool(HASHED_NAME.search(path)),
+    )
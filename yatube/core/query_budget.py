@@ -0,0 +1,49 @@
+import logging
+from functools import wraps
+
+from django.conf import settings
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+
+class QueryBudgetExceeded(Exception):
+    """A view ran more SQL queries than it declared."""
+
+
+class QueryCounter:
+    """Execute wrapper counting the queries that pass through it."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def query_budget(max_queries):
+    """
+    Declare how many SQL queries a view may run.
+
+    Going over the budget is logged, and with QUERY_BUDGET_STRICT
+    turned on (as the tests do) it raises QueryBudgetExceeded.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            counter = QueryCounter()
+            with connection.execute_wrapper(counter):
+                response = view(request, *args, **kwargs)
+            if counter.count > max_queries:
+                message = (
+                    f'{view.__module__}.{view.__name__} ran '
+                    f'{counter.count} queries, budget is {max_queries}'
+                )
+                if getattr(settings, 'QUERY_BUDGET_STRICT', False):
+                    raise QueryBudgetExceeded(message)
+                logger.warning(message)
+            return response
+        wrapper.query_budget = max_queries
+        return wrapper
+    return decorator
@@ -0,0 +1,109 @@
+"""
+Static files named by their content and compressed ahead of time.
+
+collectstatic with CompressedManifestStaticFilesStorage copies every
+file under a name with a hash of its content, rewrites the url()s of
+stylesheets to those names, and writes a .gz copy, and a .br one when
+the brotli package is installed, next to each text file. {% static %}
+then resolves names to the hashed ones, so a changed file gets a new
+URL and browsers can keep every file for a year.
+
+    STATICFILES_STORAGE = (
+        'core.staticfiles.CompressedManifestStaticFilesStorage'
+    )
+
+serve sends the collected files for when no front server maps
+STATIC_URL, picking the smallest encoding the browser accepts.
+"""
+import gzip
+import os
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import (ManifestStaticFilesStorage,
+                                                staticfiles_storage)
+from django.core.files.base import ContentFile
+from django.http import FileResponse
+from django.utils.cache import patch_vary_headers
+from django.views.decorators.http import require_safe
+
+from . import compression, media
+
+COMPRESSIBLE = ('.css', '.js', '.svg', '.txt', '.json', '.xml', '.ico')
+# Extensions of the compressed copies by Content-Encoding, preferred first
+EXTENSIONS = {'br': '.br', 'gzip': '.gz'}
+# A compressed copy smaller than this share of the file is kept
+MIN_RATIO: float = 0.9
+
+
+def encoders():
+    """Content-Encoding and compress function of each precompressed copy."""
+    available = {}
+    if compression.brotli is not None:
+        available['br'] = lambda data: compression.brotli.compress(
+            data, quality=11
+        )
+    available['gzip'] = lambda data: gzip.compress(data, 9, mtime=0)
+    return available
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """ManifestStaticFilesStorage also writing compressed copies."""
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        for name in self.hashed_files.values():
+            if name.endswith(COMPRESSIBLE):
+                yield from self.compress(name)
+
+    def compress(self, name):
+        with self.open(name) as file_:
+            data = file_.read()
+        for encoding, encode in encoders().items():
+            compressed = encode(data)
+            if len(compressed) >= len(data) * MIN_RATIO:
+                continue
+            compressed_name = name + EXTENSIONS[encoding]
+            if self.exists(compressed_name):
+                self.delete(compressed_name)
+            self._save(compressed_name, ContentFile(compressed))
+            yield name, compressed_name, True
+
+    def stored_name(self, name):
+        """The hashed name, or name itself before collectstatic has run."""
+        try:
+            return super().stored_name(name)
+        except ValueError:
+            return name
+
+
+def hashed(path):
+    """Whether path is a content-hashed name made by collectstatic."""
+    return path in getattr(staticfiles_storage, 'hashed_files', {}).values()
+
+
+def accepted(request):
+    """Encodings of the precompressed copies the browser accepts."""
+    codings = compression.accepted(request)
+    return [encoding for encoding in EXTENSIONS if encoding in codings]
+
+
+@require_safe
+def serve(request, path):
+    """Send a collected static file, compressed when the browser allows."""
+    def send(full_path, stat, content_type):
+        for encoding in accepted(request):
+            if os.path.isfile(full_path + EXTENSIONS[encoding]):
+                response = FileResponse(
+                    open(full_path + EXTENSIONS[encoding], 'rb'),
+                    content_type=content_type,
+                )
+                response['Content-Encoding'] = encoding
+                return response
+        return FileResponse(open(full_path, 'rb'), content_type=content_type)
+    response = media.serve_file(
+        request, settings.STATIC_ROOT, path, send, immutable=hashed(path)
+    )
+    patch_vary_headers(response, ['Accept-Encoding'])
+    return response
@@ -0,0 +1,54 @@
+"""
+File storage keeping each distinct content once.
+
+A file is saved under the SHA-256 of its bytes, in the directory the
+field asked for, so the same picture uploaded twice is written once
+and gets the same name, which also lets everything keyed by the name,
+thumbnails included, be shared.
+
+    image = models.ImageField(
+        storage=ContentAddressedStorage(), upload_to='posts/'
+    )
+
+Nothing here knows who uses a file, callers that delete must count the
+references themselves.
+"""
+import hashlib
+import os
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+# Files are spread over subdirectories named by this many hex digits
+FANOUT: int = 2
+PARTIAL_SUFFIX: str = '.part'
+
+
+def content_name(name, content):
+    """Name of content under the directory of name, keeping its extension."""
+    digest = hashlib.sha256()
+    for chunk in content.chunks():
+        digest.update(chunk)
+    content.seek(0)
+    directory, basename = os.path.split(name)
+    hexdigest = digest.hexdigest()
+    return os.path.join(
+        directory,
+        hexdigest[:FANOUT],
+        hexdigest + os.path.splitext(basename)[1].lower(),
+    )
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """FileSystemStorage saving files under the SHA-256 of their bytes."""
+
+    def _save(self, name, content):
+        name = content_name(name, content)
+        if self.exists(name):
+            return name
+        # Written aside and renamed, so that no one sees half a file and
+        # two uploads of the same bytes at once do not collide
+        partial = super()._save(name + PARTIAL_SUFFIX, content)
+        os.replace(self.path(partial), self.path(name))
+        return name
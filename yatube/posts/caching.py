@@ -0,0 +1,355 @@
+import copy
+import hashlib
+import logging
+import math
+import random
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial, wraps
+
+from django.core.cache import cache
+from django.db import close_old_connections
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
+
+from core import compression, holes
+
+logger = logging.getLogger(__name__)
+
+FEED: str = 'feed'
+VERSION_KEY_PREFIX: str = 'posts:version'
+PAGE_KEY_PREFIX: str = 'posts:page'
+LOCK_KEY_PREFIX: str = 'posts:lock'
+METRICS_KEY_PREFIX: str = 'posts:metrics'
+# How long a stale page is kept past its timeout, to be served while
+# a single request renders the fresh one
+STALE_GRACE: int = 60 * 10
+# Threads re-rendering stale pages, and how many refreshes may be
+# running or queued at once before further ones are dropped
+REFRESH_WORKERS: int = 2
+MAX_REFRESHES: int = 8
+# A render holding the lock longer than this is presumed dead
+LOCK_TIMEOUT: int = 30
+# How long a request with nothing stale to serve waits for the render
+LOCK_WAIT: float = 2.0
+LOCK_POLL: float = 0.05
+# Above 1 favours earlier recomputation, below 1 later
+XFETCH_BETA: float = 1.0
+
+STALE_SERVED: str = 'stale_served'
+REFRESHED: str = 'refreshed'
+REFRESH_FAILED: str = 'refresh_failed'
+REFRESH_DROPPED: str = 'refresh_dropped'
+METRICS = (STALE_SERVED, REFRESHED, REFRESH_FAILED, REFRESH_DROPPED)
+
+CachedPage = namedtuple('CachedPage', 'response version expires delta')
+
+_refresh_slots = threading.BoundedSemaphore(MAX_REFRESHES)
+_refresh_pool = None
+_refresh_pool_lock = threading.Lock()
+
+
+def group_scope(slug):
+    return f'group:{slug}'
+
+
+def author_scope(username):
+    return f'author:{username}'
+
+
+def post_scope(post_id):
+    return f'post:{post_id}'
+
+
+def _version_key(scope):
+    return f'{VERSION_KEY_PREFIX}:{scope}'
+
+
+def _initial_version():
+    """
+    Start a scope from the clock, not from 1.
+
+    If a version key is evicted, counting again from 1 could hit pages
+    cached under an old version and serve them as fresh.
+    """
+    return time.time_ns() // 1000
+
+
+def versions(scopes):
+    """Return one string holding the current versions of the scopes."""
+    keys = [_version_key(scope) for scope in scopes]
+    found = cache.get_many(keys)
+    for key in keys:
+        if key not in found:
+            cache.add(key, _initial_version(), timeout=None)
+            found[key] = cache.get(key)
+    return '.'.join(str(found[key]) for key in keys)
+
+
+def bump(*scopes):
+    """Move the scopes to a new version, so their cached pages go stale."""
+    for scope in scopes:
+        key = _version_key(scope)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, _initial_version(), timeout=None)
+
+
+def early_expired(expires, delta, beta=XFETCH_BETA):
+    """
+    Probabilistic early expiration (XFetch).
+
+    A value that took delta seconds to compute is treated as expired
+    a random while before expires, the costlier the earlier, so that
+    one request recomputes it ahead of the crowd.
+    """
+    return time.time() - delta * beta * math.log(
+        1.0 - random.random()
+    ) >= expires
+
+
+def _url_digest(request):
+    return hashlib.md5(request.build_absolute_uri().encode()).hexdigest()
+
+
+def _page_key(request, key_prefix):
+    # Not varied by Cookie: personalized parts are holes filled later
+    return f'{PAGE_KEY_PREFIX}:{key_prefix}:{_url_digest(request)}'
+
+
+def _lock_key(request, key_prefix):
+    return f'{LOCK_KEY_PREFIX}:{key_prefix}:{_url_digest(request)}'
+
+
+def _cacheable(response):
+    return (
+        response.status_code == 200
+        and not response.streaming
+        and not response.cookies
+    )
+
+
+def _metric_key(key_prefix, name):
+    return f'{METRICS_KEY_PREFIX}:{key_prefix}:{name}'
+
+
+def count(key_prefix, name):
+    """Add one to a metric of the pages cached under key_prefix."""
+    key = _metric_key(key_prefix, name)
+    try:
+        cache.incr(key)
+    except ValueError:
+        if not cache.add(key, 1, timeout=None):
+            cache.incr(key)
+
+
+def metrics(key_prefix):
+    """Return the metrics of the pages cached under key_prefix."""
+    found = cache.get_many(
+        [_metric_key(key_prefix, name) for name in METRICS]
+    )
+    return {
+        name: found.get(_metric_key(key_prefix, name), 0)
+        for name in METRICS
+    }
+
+
+def _render(view, request, args, kwargs, timeouts, key_prefix, version):
+    """Run the view for all users and store its response."""
+    timeout, hard_timeout = timeouts
+    holes.punch(request)
+    start = time.monotonic()
+    response = view(request, *args, **kwargs)
+    delta = time.monotonic() - start
+    if _cacheable(response):
+        # Compressed once here rather than for every request served
+        compression.precompress(response)
+        cache.set(
+            _page_key(request, key_prefix),
+            CachedPage(response, version, time.time() + timeout, delta),
+            hard_timeout,
+        )
+    return response
+
+
+def _cached_page(request, key_prefix):
+    return cache.get(_page_key(request, key_prefix))
+
+
+def _pool():
+    global _refresh_pool
+    with _refresh_pool_lock:
+        if _refresh_pool is None:
+            _refresh_pool = ThreadPoolExecutor(
+                max_workers=REFRESH_WORKERS,
+                thread_name_prefix='page-refresh',
+            )
+        return _refresh_pool
+
+
+def _refresh(lock, render, key_prefix):
+    """Re-render a stale page in a pool thread, the way a request would."""
+    close_old_connections()
+    try:
+        render()
+        count(key_prefix, REFRESHED)
+    except Exception:
+        logger.exception('Refreshing a %s page failed', key_prefix)
+        count(key_prefix, REFRESH_FAILED)
+    finally:
+        cache.delete(lock)
+        _refresh_slots.release()
+        close_old_connections()
+
+
+def _refresh_later(lock, render, key_prefix):
+    """Queue a refresh unless one is running or the pool is full."""
+    if not cache.add(lock, True, LOCK_TIMEOUT):
+        return
+    if not _refresh_slots.acquire(blocking=False):
+        cache.delete(lock)
+        count(key_prefix, REFRESH_DROPPED)
+        return
+    try:
+        _pool().submit(_refresh, lock, render, key_prefix)
+    except RuntimeError:
+        cache.delete(lock)
+        _refresh_slots.release()
+        raise
+
+
+def _serve_stale(page, lock, refresh, key_prefix):
+    """Send a stale page while refresh renders it anew on the pool."""
+    _refresh_later(lock, refresh, key_prefix)
+    count(key_prefix, STALE_SERVED)
+    return page.response
+
+
+def _outdated(page):
+    """
+    The response of a page rendered before a bump of its scopes.
+
+    conditional() sends it without an ETag, which is made from the
+    current versions and would let the browser keep the old page.
+    """
+    page.response.outdated = True
+    return page.response
+
+
+def _render_once(request, key_prefix, page, version, render, run_view):
+    """
+    Render a missing or stale page in one request at a time.
+
+    The others serve the stale page meanwhile, or wait for the fresh
+    one up to LOCK_WAIT and then run the view uncached.
+    """
+    lock = _lock_key(request, key_prefix)
+    deadline = time.monotonic() + LOCK_WAIT
+    while not cache.add(lock, True, LOCK_TIMEOUT):
+        if page is not None:
+            count(key_prefix, STALE_SERVED)
+            if page.version != version:
+                return _outdated(page)
+            return page.response
+        if time.monotonic() >= deadline:
+            return run_view()
+        time.sleep(LOCK_POLL)
+        page = _cached_page(request, key_prefix)
+        if page is not None and page.version == version:
+            return page.response
+    try:
+        return render()
+    finally:
+        cache.delete(lock)
+
+
+def cache_page_versioned(
+    timeout, key_prefix, scopes, hard_timeout=None, background_refresh=False
+):
+    """
+    cache_page whose pages go stale when their scopes are bumped.
+
+    scopes is called with the view arguments and names what the page
+    shows; bumping any of them makes the next request render anew.
+    Only one request renders a missing or stale page at a time, the
+    others get the stale copy meanwhile, or wait for the fresh one
+    when there is none.
+
+    With background_refresh a page past its timeout, but not past
+    hard_timeout, is served at once and re-rendered on a thread pool.
+    Pages of bumped scopes are still rendered in the request, so that
+    changes show up right away.
+
+    One page is cached for all users, with holes (see core.holes) for
+    the personalized fragments, filled for each request.
+    """
+    timeouts = (timeout, hard_timeout or timeout + STALE_GRACE)
+
+    def decorator(view):
+        def cached(request, *args, **kwargs):
+            version = versions(scopes(request, *args, **kwargs))
+            page = _cached_page(request, key_prefix)
+
+            def render(request):
+                return _render(
+                    view, request, args, kwargs, timeouts, key_prefix, version
+                )
+
+            if page is not None and page.version == version:
+                if not early_expired(page.expires, page.delta):
+                    return page.response
+                if background_refresh:
+                    return _serve_stale(
+                        page,
+                        _lock_key(request, key_prefix),
+                        partial(render, copy.copy(request)),
+                        key_prefix,
+                    )
+            return _render_once(
+                request,
+                key_prefix,
+                page,
+                version,
+                partial(render, request),
+                lambda: view(request, *args, **kwargs),
+            )
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method != 'GET':
+                return view(request, *args, **kwargs)
+            return holes.fill(request, cached(request, *args, **kwargs))
+        return wrapper
+    return decorator
+
+
+def conditional(scopes):
+    """
+    Answer If-None-Match from the versions of the page's scopes.
+
+    The ETag changes whenever a scope is bumped or another user asks,
+    so a repeat visit gets 304 Not Modified without running the view.
+    Responses are marked no-cache: browsers revalidate every time and
+    see changes at once, for the price of a 304. A page served from
+    before a bump while another request renders it gets no ETag.
+    """
+    def etag(request, *args, **kwargs):
+        version = versions(scopes(request, *args, **kwargs))
+        return hashlib.md5(
+            f'{version}:{request.user.id}'.encode()
+        ).hexdigest()
+
+    def decorator(view):
+        conditional_view = condition(etag_func=etag)(view)
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            response = conditional_view(request, *args, **kwargs)
+            if getattr(response, 'outdated', False):
+                del response['ETag']
+            return response
+        return cache_control(no_cache=True)(wrapper)
+    return decorator
@@ -0,0 +1,162 @@
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import (Comment, Follow, Group, Post, StoredImage, User,
+                     UserCounters)
+
+BATCH_SIZE: int = 500
+
+
+def _add(queryset, field, delta):
+    return queryset.update(**{field: F(field) + delta})
+
+
+def change_user(user_id, field, delta):
+    """Shift a counter of the user, a missing row is counted on read."""
+    _add(UserCounters.objects.filter(user_id=user_id), field, delta)
+
+
+def change_group(group_id, delta):
+    if group_id is not None:
+        _add(Group.objects.filter(id=group_id), 'posts_count', delta)
+
+
+def change_post(post_id, delta):
+    _add(Post.objects.filter(id=post_id), 'comments_count', delta)
+
+
+def change_image(name, delta):
+    """
+    Shift the number of posts using an image file.
+
+    The row stays locked until the transaction ends, so that
+    thumbnails.delete_unused cannot delete a file while it is counted.
+    """
+    if not name:
+        return
+    images = StoredImage.objects.filter(name=name)
+    if _add(images, 'posts_count', delta) or delta < 0:
+        return
+    try:
+        with transaction.atomic():
+            StoredImage.objects.create(name=name, posts_count=delta)
+    except IntegrityError:
+        # Another post with the same bytes counted it meanwhile
+        _add(images, 'posts_count', delta)
+
+
+def counters_of(user):
+    """Return the counters of the user, even if they were never stored."""
+    try:
+        return user.counters
+    except UserCounters.DoesNotExist:
+        reconcile_users(User.objects.filter(id=user.id))
+        return UserCounters.objects.get(user_id=user.id)
+
+
+def _count(model, field):
+    """Count rows of model pointing to the outer row through field."""
+    rows = model.objects.filter(
+        **{field: OuterRef('pk')}
+    ).order_by().values(field).annotate(total=Count('pk')).values('total')
+    return Coalesce(Subquery(rows), 0)
+
+
+def _batches(queryset, batch_size):
+    """Walk a queryset in primary key order, batch_size rows at a time."""
+    last_pk = 0
+    while True:
+        batch = list(queryset.filter(pk__gt=last_pk).order_by('pk')[
+            :batch_size
+        ])
+        if not batch:
+            return
+        yield batch
+        last_pk = batch[-1].pk
+
+
+def reconcile_users(users, batch_size=BATCH_SIZE):
+    """Recount the counters of users, return how many were repaired."""
+    repaired = 0
+    users = users.annotate(
+        actual_posts=_count(Post, 'author'),
+        actual_followers=_count(Follow, 'author'),
+        actual_following=_count(Follow, 'user'),
+    )
+    for batch in _batches(users, batch_size):
+        stored = UserCounters.objects.in_bulk(
+            [user.pk for user in batch], field_name='user_id'
+        )
+        for user in batch:
+            actual = {
+                'posts_count': user.actual_posts,
+                'followers_count': user.actual_followers,
+                'following_count': user.actual_following,
+            }
+            counters = stored.get(user.pk)
+            if counters is None:
+                UserCounters.objects.get_or_create(user=user, defaults=actual)
+                repaired += 1
+            elif any(
+                getattr(counters, field) != value
+                for field, value in actual.items()
+            ):
+                UserCounters.objects.filter(pk=counters.pk).update(**actual)
+                repaired += 1
+    return repaired
+
+
+def _reconcile(queryset, field, actual, batch_size):
+    repaired = 0
+    queryset = queryset.annotate(actual=actual)
+    for batch in _batches(queryset, batch_size):
+        for obj in batch:
+            if getattr(obj, field) != obj.actual:
+                type(obj).objects.filter(pk=obj.pk).update(
+                    **{field: obj.actual}
+                )
+                repaired += 1
+    return repaired
+
+
+def reconcile_groups(batch_size=BATCH_SIZE):
+    return _reconcile(
+        Group.objects.only('pk', 'posts_count'),
+        'posts_count',
+        _count(Post, 'group'),
+        batch_size,
+    )
+
+
+def reconcile_posts(batch_size=BATCH_SIZE):
+    return _reconcile(
+        Post.objects.only('pk', 'comments_count'),
+        'comments_count',
+        _count(Comment, 'post'),
+        batch_size,
+    )
+
+
+def reconcile_images(batch_size=BATCH_SIZE):
+    """Recount the posts of every image file, count the untracked ones."""
+    posts = Post.objects.filter(image=OuterRef('name')).order_by().values(
+        'image'
+    ).annotate(total=Count('pk')).values('total')
+    repaired = _reconcile(
+        StoredImage.objects.only('pk', 'posts_count'),
+        'posts_count',
+        Coalesce(Subquery(posts), 0),
+        batch_size,
+    )
+    untracked = Post.objects.exclude(image='').exclude(
+        image__in=StoredImage.objects.values('name')
+    ).order_by().values('image').annotate(total=Count('pk'))
+    created = StoredImage.objects.bulk_create(
+        [
+            StoredImage(name=row['image'], posts_count=row['total'])
+            for row in untracked.iterator()
+        ],
+        batch_size=batch_size,
+    )
+    return repaired + len(created)
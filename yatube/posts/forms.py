@@ -1,6 +1,10 @@
 from django import forms
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.template.defaultfilters import filesizeformat
 
 from .models import Comment, Post
+from .thumbnails import downscale, too_many_pixels
 
 
 class PostForm(forms.ModelForm):
@@ -12,6 +16,30 @@ class PostForm(forms.ModelForm):
             'name': 'choose file',
         } 
 
+    def clean_image(self):
+        """
+        Refuse files over UPLOAD_MAX_SIZE and images with too many
+        pixels in their header, scale oversize images down.
+
+        ImageField has only parsed the header so far, nothing is decoded
+        before these checks pass.
+        """
+        image = self.cleaned_data['image']
+        if not isinstance(image, UploadedFile):
+            # No upload, or the image the post already has
+            return image
+        if image.size > settings.UPLOAD_MAX_SIZE:
+            raise forms.ValidationError(
+                'The file is larger than %(limit)s.',
+                code='too_large',
+                params={'limit': filesizeformat(settings.UPLOAD_MAX_SIZE)},
+            )
+        if too_many_pixels(image):
+            raise forms.ValidationError(
+                'The image has too many pixels.', code='too_many_pixels'
+            )
+        return downscale(image)
+
 
 class CommentForm(forms.ModelForm):
     """Form for adding a comment to a post"""
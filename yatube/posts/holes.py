@@ -0,0 +1,44 @@
+from django.template.loader import render_to_string
+
+from core import holes
+from .forms import CommentForm
+from .models import Follow
+
+
+@holes.register('switcher')
+def switcher(request, tab):
+    return render_to_string(
+        'includes/switcher.html', {tab: True}, request=request
+    )
+
+
+@holes.register('follow_button')
+def follow_button(request, username):
+    following = request.user.is_authenticated and Follow.objects.filter(
+        user=request.user, author__username=username
+    ).exists()
+    return render_to_string(
+        'includes/follow_button.html',
+        {'username': username, 'following': following},
+        request=request,
+    )
+
+
+@holes.register('comment_form')
+def comment_form(request, post_id):
+    """The form carries the CSRF token of the session, never cached."""
+    return render_to_string(
+        'includes/comment_form.html',
+        {'post_id': post_id, 'form': CommentForm()},
+        request=request,
+    )
+
+
+@holes.register('delete_button')
+def delete_button(request, post_id, username):
+    """A form posting the CSRF token of the session, never cached."""
+    return render_to_string(
+        'includes/delete_button.html',
+        {'post_id': post_id, 'username': username},
+        request=request,
+    )
@@ -0,0 +1,53 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from posts import thumbnails
+from posts.models import Post
+
+
+def backfill(post):
+    """Measure the image of a post if it is not yet, and make variants."""
+    if post.image_width is None:
+        thumbnails.measure_post(post)
+        Post.objects.filter(id=post.id).update(**{
+            field: getattr(post, field)
+            for field in thumbnails.MEASURED_FIELDS
+        })
+        close_old_connections()
+    return thumbnails.generate(
+        post.image.name, thumbnails.geometries(post.image_width)
+    )
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure the images of existing posts and make their missing '
+        'variants.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            default=4,
+            type=int,
+            help='Number of images resized at a time.',
+        )
+
+    def handle(self, *args, **options):
+        # Read up front, so that no cursor stays open while workers write
+        posts = list(
+            Post.objects.exclude(image='').only('image', 'image_width')
+        )
+        images = failed = 0
+        # Pillow lets go of the GIL while it decodes and resizes
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            for count in pool.map(backfill, posts):
+                images += 1
+                failed += count
+        self.stdout.write(f'Images checked: {images}')
+        if failed:
+            self.stdout.write(self.style.ERROR(f'Variants failed: {failed}'))
+        else:
+            self.stdout.write(self.style.SUCCESS('Image variants made.'))
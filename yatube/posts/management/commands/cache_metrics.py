@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from posts import caching
+
+KEY_PREFIXES = ('index', 'group', 'profile')
+
+
+class Command(BaseCommand):
+    help = 'Show how cached pages were served and refreshed.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'key_prefixes',
+            nargs='*',
+            default=KEY_PREFIXES,
+            help='Key prefixes of the cached views to report.',
+        )
+
+    def handle(self, *args, **options):
+        for key_prefix in options['key_prefixes']:
+            values = caching.metrics(key_prefix)
+            self.stdout.write(
+                f'{key_prefix}: ' + ', '.join(
+                    f'{name}={value}' for name, value in values.items()
+                )
+            )
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts import timeline
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the follow timelines of all users from scratch.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            default=timeline.BATCH_SIZE,
+            type=int,
+            help='Number of rows read and written at a time.',
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            created = timeline.rebuild(batch_size=options['batch_size'])
+        self.stdout.write(
+            self.style.SUCCESS(f'Timelines rebuilt: {created} entries.')
+        )
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from posts import counters
+from posts.models import User
+
+
+class Command(BaseCommand):
+    help = 'Repair drifted post, comment, follower and image counters.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            default=counters.BATCH_SIZE,
+            type=int,
+            help='Number of rows checked at a time.',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        repaired = {
+            'users': counters.reconcile_users(
+                User.objects.all(), batch_size=batch_size
+            ),
+            'groups': counters.reconcile_groups(batch_size=batch_size),
+            'posts': counters.reconcile_posts(batch_size=batch_size),
+            'images': counters.reconcile_images(batch_size=batch_size),
+        }
+        for name, count in repaired.items():
+            self.stdout.write(f'Repaired {name}: {count}')
+        self.stdout.write(self.style.SUCCESS('Counters reconciled.'))
@@ -0,0 +1,44 @@
+# Generated by Django 2.2.28 on 2026-10-18 00:18
+
+import core.storage
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def fill_stored_images(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    StoredImage = apps.get_model('posts', 'StoredImage')
+    used = Post.objects.exclude(image='').order_by().values(
+        'image'
+    ).annotate(total=Count('pk'))
+    StoredImage.objects.bulk_create(
+        [
+            StoredImage(name=row['image'], posts_count=row['total'])
+            for row in used.iterator()
+        ],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0013_post_image_dimensions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StoredImage',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True, verbose_name='File name')),
+                ('posts_count', models.IntegerField(default=0, verbose_name='Number of posts')),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='post',
+            name='image',
+            field=models.ImageField(blank=True, storage=core.storage.ContentAddressedStorage(), upload_to='posts/', verbose_name='Image'),
+        ),
+        migrations.RunPython(fill_stored_images, migrations.RunPython.noop),
+    ]
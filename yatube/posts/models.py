@@ -1,6 +1,8 @@
 from django.contrib.auth import get_user_model
 from django.db import models
 
+from core.storage import ContentAddressedStorage
+
 User = get_user_model()
 
 
@@ -27,6 +29,12 @@ class Comment(models.Model):
 
     class Meta:
         ordering = ("-created",)
+        indexes = [
+            models.Index(
+                fields=['post', '-created', '-id'],
+                name='comment_post_created_idx',
+            ),
+        ]
 
 
 class Follow(models.Model):
@@ -69,6 +77,11 @@ class Group(models.Model):
         max_length=200,
         verbose_name='Group name',
     )
+    posts_count = models.IntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Number of posts',
+    )
 
     def __str__(self):
         return self.title
@@ -82,6 +95,11 @@ class Post(models.Model):
         related_name='posts',
         verbose_name='Name of author',
     )
+    comments_count = models.IntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Number of comments',
+    )
     group = models.ForeignKey(
         Group,
         blank=True,
@@ -91,11 +109,32 @@ class Post(models.Model):
         related_name='posts',
         verbose_name='Group',
     )
+    # Identical images are stored once, see posts.counters.change_image
     image = models.ImageField(
         blank=True,
+        storage=ContentAddressedStorage(),
         upload_to='posts/',
         verbose_name='Image',
     )
+    # Measured on save, see posts.thumbnails.measure
+    image_height = models.PositiveIntegerField(
+        blank=True,
+        editable=False,
+        null=True,
+        verbose_name='Image height',
+    )
+    image_placeholder = models.TextField(
+        blank=True,
+        editable=False,
+        help_text='Data URI of a tiny preview shown while the image loads',
+        verbose_name='Image placeholder',
+    )
+    image_width = models.PositiveIntegerField(
+        blank=True,
+        editable=False,
+        null=True,
+        verbose_name='Image width',
+    )
     pub_date = models.DateTimeField(
         auto_now_add=True,
         verbose_name='Publication date',
@@ -110,3 +149,105 @@ class Post(models.Model):
 
     class Meta:
         ordering = ("-pub_date",)
+        indexes = [
+            models.Index(
+                fields=['-pub_date', '-id'],
+                name='post_pub_date_idx',
+            ),
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='post_author_pub_date_idx',
+            ),
+            models.Index(
+                fields=['group', '-pub_date', '-id'],
+                name='post_group_pub_date_idx',
+            ),
+        ]
+
+
+class TimelineEntry(models.Model):
+    """Stores a post of a followed author in the follower's feed."""
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Author of post',
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+        verbose_name='Post',
+    )
+    pub_date = models.DateTimeField(
+        verbose_name='Publication date',
+    )
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+        verbose_name='Follower',
+    )
+
+    class Meta:
+        ordering = ('-pub_date', '-id')
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'], name='unique_timeline_post'
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-post'],
+                name='timeline_user_post_date_idx',
+            ),
+            models.Index(
+                fields=['user', 'author'],
+                name='timeline_user_author_idx',
+            ),
+        ]
+
+
+class PulledAuthor(models.Model):
+    """Stores authors whose posts are read into feeds instead of pushed."""
+    author = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Author with many followers',
+    )
+
+
+class UserCounters(models.Model):
+    """Stores denormalized counters of a user."""
+    followers_count = models.IntegerField(
+        default=0,
+        verbose_name='Number of followers',
+    )
+    following_count = models.IntegerField(
+        default=0,
+        verbose_name='Number of followed authors',
+    )
+    posts_count = models.IntegerField(
+        default=0,
+        verbose_name='Number of posts',
+    )
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        related_name='counters',
+        verbose_name='User',
+    )
+
+
+class StoredImage(models.Model):
+    """Stores how many posts use an image file, to delete unused ones."""
+    name = models.CharField(
+        max_length=100,
+        unique=True,
+        verbose_name='File name',
+    )
+    posts_count = models.IntegerField(
+        default=0,
+        verbose_name='Number of posts',
+    )
@@ -0,0 +1,167 @@
+import base64
+import binascii
+import json
+
+from django.core.paginator import Paginator
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+NEXT: str = 'n'
+PREVIOUS: str = 'p'
+# Largest value of a signed 64-bit column, the widest databases have
+MAX_INTEGER: int = 2 ** 63 - 1
+
+
+def encode_cursor(value, pk, number, direction=NEXT):
+    """Pack a position in the list into an opaque url-safe token."""
+    payload = json.dumps(
+        [value.isoformat(), pk, number, direction],
+        separators=(',', ':'),
+    )
+    token = base64.urlsafe_b64encode(payload.encode())
+    return token.decode().rstrip('=')
+
+
+def _integer(value):
+    """Whether value is an int a database column can hold, not a bool."""
+    return type(value) is int and -MAX_INTEGER - 1 <= value <= MAX_INTEGER
+
+
+def decode_cursor(token):
+    """Unpack a token made by encode_cursor, None if it is broken."""
+    if not token:
+        return None
+    try:
+        padding = '=' * (-len(token) % 4)
+        payload = base64.urlsafe_b64decode(token + padding)
+        value, pk, number, direction = json.loads(payload.decode())
+        value = parse_datetime(value)
+    except (binascii.Error, TypeError, ValueError, UnicodeDecodeError):
+        return None
+    if (
+        value is None
+        or not _integer(pk)
+        or not _integer(number)
+        or number < 1
+        or direction not in (NEXT, PREVIOUS)
+    ):
+        return None
+    return value, pk, number, direction
+
+
+class CursorPaginator(Paginator):
+    """
+    Keyset pagination over (key, tiebreak) in descending order.
+
+    A page is found by seeking from the last seen row instead of
+    skipping rows with OFFSET, and the total is never counted, so the
+    cost of a page does not depend on how deep it is.
+    Page numbers travel inside the cursor and num_pages only reaches
+    one page past the current one.
+    """
+
+    def __init__(self, object_list, per_page, key='pub_date', tiebreak='id'):
+        super().__init__(object_list, per_page)
+        self.key = key
+        self.tiebreak = tiebreak
+        self.has_more = False
+        self._number = 1
+
+    @property
+    def count(self):
+        # Page.start_index(), and end_index() of the last page, read it
+        raise TypeError(
+            'CursorPaginator does not count objects, so count and the '
+            'Page methods reading it are unsupported.'
+        )
+
+    @property
+    def num_pages(self):
+        return self._number + 1 if self.has_more else self._number
+
+    def validate_number(self, number):
+        return number
+
+    def get_page(self, cursor):
+        """Return the page pointed to by cursor, the first one if broken."""
+        position = decode_cursor(cursor)
+        if position is None:
+            return self._build_page(self._fetch(None, None, NEXT), number=1)
+        value, pk, number, direction = position
+        items = self._fetch(value, pk, direction)
+        if direction == NEXT:
+            return self._build_page(items, number=number)
+        if not items:
+            return self.get_page(None)
+        items.reverse()
+        if not self.has_more:
+            # Nothing is left above this page, so it is the first one.
+            number = 1
+        elif number == 1:
+            # Newer posts have shifted the pages since the cursor was made.
+            number = 2
+        self.has_more = True
+        return self._build_page(items, number=number)
+
+    def page(self, number):
+        raise TypeError(
+            'CursorPaginator cannot open a page by number, '
+            'use get_page(cursor).'
+        )
+
+    def seek(self, queryset, value, pk, direction, limit, tiebreak=None):
+        """
+        Return up to limit rows of queryset after (value, pk).
+
+        Rows go newest first for NEXT and oldest first for PREVIOUS.
+        """
+        return list(
+            self.seeking(queryset, value, pk, direction, tiebreak)[:limit]
+        )
+
+    def seeking(self, queryset, value, pk, direction, tiebreak=None):
+        """The rows of queryset after (value, pk), not yet evaluated."""
+        tiebreak = tiebreak or self.tiebreak
+        if direction == NEXT:
+            ordering = (f'-{self.key}', f'-{tiebreak}')
+            lookup = 'lt'
+        else:
+            ordering = (self.key, tiebreak)
+            lookup = 'gt'
+        if value is not None:
+            queryset = queryset.filter(
+                Q(**{f'{self.key}__{lookup}': value})
+                | Q(**{self.key: value, f'{tiebreak}__{lookup}': pk})
+            )
+        return queryset.order_by(*ordering)
+
+    def rows(self, value, pk, direction, limit):
+        return self.seek(self.object_list, value, pk, direction, limit)
+
+    def position(self, item):
+        """Return the (key, tiebreak) pair a cursor is made from."""
+        return getattr(item, self.key), getattr(item, self.tiebreak)
+
+    def _fetch(self, value, pk, direction):
+        """Read one extra row to learn if the list goes on."""
+        items = self.rows(value, pk, direction, self.per_page + 1)
+        self.has_more = len(items) > self.per_page
+        return items[:self.per_page]
+
+    def _build_page(self, items, number):
+        self._number = number
+        if not items and number > 1:
+            # The cursor points past the end of the list.
+            return self.get_page(None)
+        page = self._get_page(items, number, self)
+        page.next_cursor = None
+        page.previous_cursor = None
+        if items and self.has_more:
+            page.next_cursor = encode_cursor(
+                *self.position(items[-1]), number + 1, NEXT
+            )
+        if items and number > 1:
+            page.previous_cursor = encode_cursor(
+                *self.position(items[0]), number - 1, PREVIOUS
+            )
+        return page
@@ -0,0 +1,260 @@
+from django.db import transaction
+from django.db.models import DEFERRED
+from django.db.models.signals import (post_delete, post_init, post_save,
+                                      pre_delete, pre_save)
+from django.dispatch import receiver
+
+from . import caching, counters, thumbnails, timeline
+from .models import Comment, Follow, Group, Post, User, UserCounters
+
+
+def bump_on_commit(*scopes):
+    """
+    Invalidate cached pages now and once more after the commit.
+
+    A request between the two bumps may cache the old rows under the
+    new version, the second bump throws that copy away.
+    """
+    caching.bump(*scopes)
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(lambda: caching.bump(*scopes))
+
+
+def delete_unused_on_commit(name):
+    """Delete an image file after the commit, if no post uses it then."""
+    if name:
+        transaction.on_commit(lambda: thumbnails.delete_unused(name))
+
+
+def post_scopes(post, group_ids):
+    """Cache scopes showing the post."""
+    usernames = User.objects.filter(
+        id=post.author_id
+    ).values_list('username', flat=True)
+    slugs = Group.objects.filter(
+        id__in=[group_id for group_id in group_ids if group_id]
+    ).values_list('slug', flat=True)
+    return [
+        caching.FEED,
+        caching.post_scope(post.id),
+        *(caching.author_scope(username) for username in usernames),
+        *(caching.group_scope(slug) for slug in slugs),
+    ]
+
+
+@receiver(post_save, sender=User)
+def create_counters(sender, instance, created, **kwargs):
+    """Start the counters of a new user at zero."""
+    if created:
+        UserCounters.objects.get_or_create(user=instance)
+
+
+def _loaded_image(instance):
+    image = instance.__dict__.get('image', DEFERRED)
+    return getattr(image, 'name', image)
+
+
+@receiver(post_init, sender=Post)
+def remember_group(sender, instance, **kwargs):
+    """Keep the loaded group and image to notice what an edit changes."""
+    instance._loaded_group_id = instance.__dict__.get('group_id', DEFERRED)
+    instance._loaded_image = _loaded_image(instance)
+
+
+@receiver(pre_save, sender=Post)
+def measure_image(sender, instance, update_fields, **kwargs):
+    """Measure a new image once, so pages never open it to size it."""
+    loaded = instance._loaded_image
+    if not instance._state.adding and (
+        loaded is DEFERRED
+        or update_fields is not None and 'image' not in update_fields
+        or (instance.image.name or '') == (loaded or '')
+    ):
+        return
+    thumbnails.measure_post(instance)
+
+
+@receiver(post_save, sender=Post)
+def fan_out_post(sender, instance, created, **kwargs):
+    """Deliver a new post to the followers' timelines."""
+    if created:
+        timeline.push_post(instance)
+
+
+@receiver(post_save, sender=Post)
+def count_saved_post(sender, instance, created, **kwargs):
+    if created:
+        counters.change_user(instance.author_id, 'posts_count', 1)
+        counters.change_group(instance.group_id, 1)
+    elif (
+        instance._loaded_group_id is not DEFERRED
+        and instance._loaded_group_id != instance.group_id
+    ):
+        counters.change_group(instance._loaded_group_id, -1)
+        counters.change_group(instance.group_id, 1)
+
+
+@receiver(pre_save, sender=Post)
+def keep_upload(sender, instance, **kwargs):
+    """Keep a new upload, count_saved_image may have to write it again."""
+    instance._upload = None
+    if (
+        instance.__dict__.get('image', DEFERRED) is not DEFERRED
+        and not instance.image._committed
+    ):
+        instance._upload = instance.image.file
+
+
+@receiver(post_save, sender=Post)
+def count_saved_image(sender, instance, created, **kwargs):
+    """
+    Count the posts using each image file, identical ones share it.
+
+    An upload of bytes already stored is not written. If the file was
+    deleted as unused before it got counted here, it is written again.
+    """
+    name = instance.image.name or ''
+    loaded = instance._loaded_image
+    if not created:
+        if loaded is DEFERRED or (loaded or '') == name:
+            return
+        counters.change_image(loaded, -1)
+        delete_unused_on_commit(loaded)
+    counters.change_image(name, 1)
+    image = instance.image
+    if instance._upload is not None and not image.storage.exists(name):
+        image.storage.save(
+            image.field.generate_filename(instance, instance._upload.name),
+            instance._upload,
+        )
+
+
+@receiver(post_save, sender=Post)
+def invalidate_saved_post(sender, instance, **kwargs):
+    group_ids = {instance.group_id, instance._loaded_group_id} - {DEFERRED}
+    bump_on_commit(*post_scopes(instance, group_ids))
+
+
+@receiver(post_save, sender=Post)
+def pregenerate_thumbnails(sender, instance, created, **kwargs):
+    """Resize a new image on the worker pool, before a page asks for it."""
+    if instance.image and (
+        created or instance.image.name != instance._loaded_image
+    ):
+        thumbnails.schedule(
+            instance.image.name, thumbnails.geometries(instance.image_width)
+        )
+
+
+@receiver(post_save, sender=Post)
+def forget_group(sender, instance, **kwargs):
+    """Receivers above compare with the values from before this save."""
+    instance._loaded_group_id = instance.__dict__.get('group_id', DEFERRED)
+    instance._loaded_image = _loaded_image(instance)
+
+
+@receiver(post_delete, sender=Post)
+def count_deleted_post(sender, instance, **kwargs):
+    counters.change_user(instance.author_id, 'posts_count', -1)
+    counters.change_group(instance.group_id, -1)
+
+
+@receiver(post_delete, sender=Post)
+def count_deleted_image(sender, instance, **kwargs):
+    counters.change_image(instance.image.name, -1)
+    delete_unused_on_commit(instance.image.name)
+
+
+@receiver(post_delete, sender=Post)
+def invalidate_deleted_post(sender, instance, **kwargs):
+    bump_on_commit(*post_scopes(instance, [instance.group_id]))
+
+
+def group_scopes(group, slugs):
+    """
+    Cache scopes showing the group: pages of its posts ask for the
+    group scope, profiles of their authors are bumped one by one.
+    """
+    usernames = User.objects.filter(
+        posts__group=group
+    ).distinct().values_list('username', flat=True)
+    return [
+        caching.FEED,
+        *(caching.group_scope(slug) for slug in slugs),
+        *(caching.author_scope(username) for username in usernames),
+    ]
+
+
+@receiver(pre_save, sender=Group)
+def remember_slug(sender, instance, **kwargs):
+    """The page under the old slug goes stale too."""
+    instance._loaded_slug = None
+    if instance.pk is not None:
+        instance._loaded_slug = Group.objects.filter(
+            pk=instance.pk
+        ).values_list('slug', flat=True).first()
+
+
+@receiver(post_save, sender=Group)
+def invalidate_saved_group(sender, instance, **kwargs):
+    slugs = {instance.slug, instance._loaded_slug} - {None}
+    bump_on_commit(*group_scopes(instance, slugs))
+
+
+@receiver(pre_delete, sender=Group)
+def invalidate_deleted_group(sender, instance, **kwargs):
+    """Before the posts of the group are moved out of it."""
+    bump_on_commit(*group_scopes(instance, [instance.slug]))
+
+
+@receiver([post_save, post_delete], sender=Comment)
+def invalidate_comment(sender, instance, **kwargs):
+    bump_on_commit(caching.post_scope(instance.post_id))
+
+
+@receiver(post_save, sender=Comment)
+def count_saved_comment(sender, instance, created, **kwargs):
+    if created:
+        counters.change_post(instance.post_id, 1)
+
+
+@receiver(post_delete, sender=Comment)
+def count_deleted_comment(sender, instance, **kwargs):
+    counters.change_post(instance.post_id, -1)
+
+
+@receiver(post_save, sender=Follow)
+def count_saved_follow(sender, instance, created, **kwargs):
+    if created:
+        counters.change_user(instance.author_id, 'followers_count', 1)
+        counters.change_user(instance.user_id, 'following_count', 1)
+
+
+@receiver(post_save, sender=Follow)
+def backfill_timeline(sender, instance, created, **kwargs):
+    """Show the posts of a new followed author in the timeline."""
+    if created:
+        timeline.backfill(instance.user_id, instance.author_id)
+        # Reads the counter count_saved_follow has just updated
+        timeline.update_mode(instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def prune_timeline(sender, instance, **kwargs):
+    """Hide the posts of an unfollowed author from the timeline."""
+    timeline.prune(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def count_deleted_follow(sender, instance, **kwargs):
+    counters.change_user(instance.author_id, 'followers_count', -1)
+    counters.change_user(instance.user_id, 'following_count', -1)
+
+
+@receiver([post_save, post_delete], sender=Follow)
+def invalidate_follow(sender, instance, **kwargs):
+    """Both profiles show counters the follow changes."""
+    usernames = User.objects.filter(
+        id__in=[instance.author_id, instance.user_id]
+    ).values_list('username', flat=True)
+    bump_on_commit(*(caching.author_scope(name) for name in usernames))
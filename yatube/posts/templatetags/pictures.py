@@ -0,0 +1,58 @@
+from django import template
+
+from ..thumbnails import (DEFAULT_WIDTH, FORMATS, ThumbnailBackend, height,
+                          schedule, variant, widths)
+
+register = template.Library()
+
+# Feed images take the whole column on phones and 700px above them
+SIZES: str = '(max-width: 700px) 100vw, 700px'
+
+
+@register.inclusion_tag('includes/picture.html')
+def picture(image, crop, sizes=SIZES, **attrs):
+    """
+    <picture> of the variants of an image, the best format first.
+
+    Variants not made yet are queued and left out of the srcset, and
+    the <img> shows the original image until the default one is made.
+    Whatever the image, it covers the same box, cropped on the crop side,
+    over the placeholder measured with it.
+    """
+    post = image.instance
+    backend = ThumbnailBackend()
+    sources = []
+    missing = []
+    for format_, mime_type in FORMATS.items():
+        srcset = {}
+        fallback = None
+        for width in widths(post.image_width):
+            geometry, options = variant(crop, width, format_)
+            thumbnail = backend.lookup(image, geometry, options)
+            if not thumbnail:
+                missing.append((geometry, options))
+                continue
+            # Variants of a small image repeat its own width
+            srcset.setdefault(thumbnail.x, thumbnail.url)
+            if width <= DEFAULT_WIDTH:
+                fallback = thumbnail
+        if srcset:
+            sources.append({
+                'type': mime_type,
+                'srcset': ', '.join(
+                    f'{url} {width}w' for width, url in srcset.items()
+                ),
+            })
+    if missing:
+        schedule(image.name, missing)
+    return {
+        'sources': sources,
+        'sizes': sizes,
+        # The last format is the fallback one
+        'src': (fallback or image).url,
+        'width': DEFAULT_WIDTH,
+        'height': height(DEFAULT_WIDTH),
+        'position': crop,
+        'placeholder': post.image_placeholder,
+        'attrs': attrs,
+    }
@@ -0,0 +1,57 @@
+import hashlib
+import time
+
+from django import template
+from django.core.cache import cache
+from django.template.loader import render_to_string
+
+from ..caching import early_expired
+from ..thumbnails import ready
+
+register = template.Library()
+
+CARD_KEY_PREFIX: str = 'post_card:v3'
+CARD_TIMEOUT: int = 60 * 60 * 24
+
+
+def card_key(post):
+    """
+    Cache key of a card, it changes whenever the card would.
+
+    That includes the image getting measured and its variants getting
+    made, which replace the original image standing in for them.
+    """
+    digest = hashlib.md5('\x1f'.join((
+        post.text,
+        post.image.name or '',
+        'ready' if ready(post) else '',
+        str(post.image_width),
+        post.pub_date.isoformat(),
+        post.author.username,
+        post.group.slug if post.group_id else '',
+    )).encode()).hexdigest()
+    return f'{CARD_KEY_PREFIX}:{post.id}:{digest}'
+
+
+@register.simple_tag
+def post_cards(posts):
+    """Rendered cards of the posts, fetched from cache in one round trip."""
+    keys = {post.id: card_key(post) for post in posts}
+    cards = {
+        key: html
+        for key, (html, expires, delta) in cache.get_many(
+            keys.values()
+        ).items()
+        if not early_expired(expires, delta)
+    }
+    missing = {}
+    for post in posts:
+        if keys[post.id] not in cards:
+            start = time.monotonic()
+            html = render_to_string('includes/post_card.html', {'post': post})
+            delta = time.monotonic() - start
+            cards[keys[post.id]] = html
+            missing[keys[post.id]] = (html, time.time() + CARD_TIMEOUT, delta)
+    if missing:
+        cache.set_many(missing, CARD_TIMEOUT)
+    return [cards[keys[post.id]] for post in posts]
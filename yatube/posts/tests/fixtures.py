@@ -0,0 +1,16 @@
+"""Фикстуры pytest для тестов posts, их подключает корневой conftest."""
+import pytest
+
+from .utils import InlinePool
+
+
+@pytest.fixture(autouse=True)
+def inline_thumbnails(monkeypatch):
+    """
+    Миниатюры создаются до конца теста: иначе пул мог бы еще писать
+    их, когда тест удаляет свой MEDIA_ROOT.
+    """
+    from posts import thumbnails
+    pool = InlinePool()
+    monkeypatch.setattr(thumbnails, '_executor', lambda: pool)
+    return pool
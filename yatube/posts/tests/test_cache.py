@@ -1,9 +1,18 @@
+import threading
+import time
+from io import StringIO
+from unittest import mock
+
 from django.core.cache import cache
-from django.test import TestCase
+from django.core.management import call_command
+from django.test import RequestFactory, TestCase
 from django.urls import reverse
 from random import randint
 
-from ..models import Group, Post, User
+from ..caching import (FEED, REFRESH_DROPPED, REFRESH_FAILED, REFRESHED,
+                       STALE_SERVED, VERSION_KEY_PREFIX, _lock_key, bump,
+                       early_expired, metrics, versions)
+from ..models import Comment, Group, Post, User
 
 
 class TestCacheIndex(TestCase):
@@ -45,13 +54,229 @@ class TestCacheIndex(TestCase):
         # Удаляем пост
         one_extra_post.delete()
         # Делаем новый запрос к главной странице
-        response_cached = self.client.get(reverse('posts:index'))
+        response_after_delete = self.client.get(reverse('posts:index'))
         # Проверяем, что количество постов после удаления уменьшилось на '1'
         self.assertEqual(Post.objects.count(), count_after_add_extra_post - 1)
-        # Проверяем контент до и после удаления поста
+        # Удаление поста сразу сбрасывает версию кеша главной страницы
+        self.assertNotEqual(response.content, response_after_delete.content)
+        self.assertNotContains(response_after_delete, one_extra_post.text)
+
+    def test_index_served_from_cache_without_changes(self):
+        """Без событий главная страница отдается из кеша."""
+        cache.clear()
+        response = self.client.get(reverse('posts:index'))
+        # update() не посылает сигналов, версия кеша не меняется
+        Post.objects.update(text='Измененный в обход модели текст')
+        response_cached = self.client.get(reverse('posts:index'))
         self.assertEqual(response.content, response_cached.content)
+        self.assertNotIn('page_obj', response_cached.context)
+
+    def test_comment_does_not_invalidate_index(self):
+        """Комментарий не сбрасывает кеш главной страницы."""
+        cache.clear()
+        response = self.client.get(reverse('posts:index'))
+        Comment.objects.create(
+            text='Комментарий',
+            post=TestCacheIndex.post,
+            author=TestCacheIndex.user,
+        )
+        response_cached = self.client.get(reverse('posts:index'))
+        self.assertNotIn('page_obj', response_cached.context)
+        self.assertEqual(response.content, response_cached.content)
+
+    def test_post_invalidates_group_and_profile(self):
+        """Новый пост сбрасывает кеш своей группы и профиля автора."""
+        cache.clear()
+        urls = [
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': self.user.username}),
+        ]
+        for url in urls:
+            self.client.get(url)
+        Post.objects.create(
+            text='Свежий пост',
+            author=TestCacheIndex.user,
+            group=TestCacheIndex.group,
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertIsNotNone(response.context)
+                self.assertEqual(
+                    response.context['page_obj'][0].text, 'Свежий пост'
+                )
+
+    def test_other_group_stays_cached(self):
+        """Пост в одной группе не сбрасывает кеш другой группы."""
+        cache.clear()
+        other_group = Group.objects.create(
+            title='Другая группа',
+            slug='other-slug',
+            description='Другое описание',
+        )
+        url = reverse('posts:group_list', kwargs={'slug': other_group.slug})
+        self.client.get(url)
+        Post.objects.create(
+            text='Пост в первой группе',
+            author=TestCacheIndex.user,
+            group=TestCacheIndex.group,
+        )
+        self.assertNotIn('page_obj', self.client.get(url).context)
+
+    def test_group_change_invalidates_pages_showing_it(self):
+        """
+        Смена адреса группы сбрасывает кеш профиля автора, страницы
+        поста и страницы группы под старым адресом.
+        """
+        cache.clear()
+        group = Group.objects.create(
+            title='Старое название', slug='old-slug', description='Описание'
+        )
+        post = Post.objects.create(
+            text='Пост группы', author=TestCacheIndex.user, group=group
+        )
+        urls = [
+            reverse('posts:profile', kwargs={'username': self.user.username}),
+            reverse('posts:post_detail', kwargs={'post_id': post.id}),
+            reverse('posts:group_list', kwargs={'slug': 'old-slug'}),
+        ]
+        for url in urls:
+            self.client.get(url)
+        group.slug = 'new-slug'
+        group.save()
+        for url in urls[:2]:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertIsNotNone(response.context)
+                self.assertContains(response, 'new-slug')
+        self.assertEqual(self.client.get(urls[2]).status_code, 404)
+
+    def test_evicted_version_is_not_reused(self):
+        """Потерянная версия не возвращает старые страницы из кеша."""
         cache.clear()
-        # Делаем новый запрос после чистки кеша
-        response_cleared = self.client.get(reverse('posts:index'))
-        # Сравниваем контент до удаления поста и после чистки кеша
-        self.assertNotEqual(response.content, response_cleared.content)
+        old_version = versions([FEED])
+        bump(FEED)
+        cache.delete(f'{VERSION_KEY_PREFIX}:{FEED}')
+        self.assertNotEqual(versions([FEED]), old_version)
+
+
+class TestStampedeProtection(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='some_user')
+        cls.post = Post.objects.create(text='Старый пост', author=cls.user)
+
+    def setUp(self):
+        cache.clear()
+        self.url = reverse('posts:index')
+        self.lock = _lock_key(RequestFactory().get(self.url), 'index')
+
+    def test_stale_page_is_served_while_locked(self):
+        """Пока страницу рендерит другой запрос, отдается устаревшая копия."""
+        response = self.client.get(self.url)
+        bump(FEED)
+        cache.add(self.lock, True)
+        with self.assertNumQueries(0):
+            response_stale = self.client.get(self.url)
+        self.assertNotIn('page_obj', response_stale.context)
+        self.assertEqual(response.content, response_stale.content)
+        cache.delete(self.lock)
+        self.assertIn('page_obj', self.client.get(self.url).context)
+
+    def test_stale_page_has_no_etag(self):
+        """Устаревшая копия отдается без ETag новой версии"""
+        etag = self.client.get(self.url)['ETag']
+        bump(FEED)
+        cache.add(self.lock, True)
+        response_stale = self.client.get(self.url)
+        self.assertFalse(response_stale.has_header('ETag'))
+        cache.delete(self.lock)
+        response = self.client.get(self.url)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_waiter_renders_when_lock_is_not_released(self):
+        """Без устаревшей копии запрос ждет рендера, но не дольше LOCK_WAIT."""
+        cache.add(self.lock, True)
+        with mock.patch('posts.caching.LOCK_WAIT', 0.1):
+            start = time.monotonic()
+            response = self.client.get(self.url)
+        self.assertGreaterEqual(time.monotonic() - start, 0.1)
+        self.assertContains(response, 'some_user')
+
+    def test_lock_is_released_after_render(self):
+        """После рендера блокировка снимается."""
+        self.client.get(self.url)
+        self.assertIsNone(cache.get(self.lock))
+
+    def test_early_expiration(self):
+        """Чем дороже значение, тем раньше оно считается просроченным."""
+        now = time.time()
+        self.assertFalse(early_expired(now + 60, delta=0))
+        self.assertTrue(early_expired(now - 1, delta=0))
+        self.assertTrue(early_expired(now + 60, delta=10 ** 6))
+
+
+class InlinePool:
+    """Пул, выполняющий задачу сразу, в потоке запроса."""
+
+    def submit(self, fn, *args):
+        fn(*args)
+
+
+@mock.patch('posts.caching.close_old_connections', mock.Mock())
+@mock.patch('posts.caching._pool', mock.Mock(return_value=InlinePool()))
+class TestStaleWhileRevalidate(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='some_user')
+        cls.post = Post.objects.create(text='Старый текст', author=cls.user)
+
+    def setUp(self):
+        cache.clear()
+        self.url = reverse('posts:index')
+        self.response = self.client.get(self.url)
+        # update() не меняет версию кеша: страница устаревает только по TTL
+        Post.objects.update(text='Новый текст')
+
+    def get_expired(self):
+        with mock.patch('posts.caching.early_expired', return_value=True):
+            return self.client.get(self.url)
+
+    def test_stale_page_is_served_and_refreshed(self):
+        """Устаревшая страница отдается сразу и обновляется в фоне."""
+        response = self.get_expired()
+        self.assertEqual(response.content, self.response.content)
+        self.assertContains(self.client.get(self.url), 'Новый текст')
+        counters = metrics('index')
+        self.assertEqual(counters[STALE_SERVED], 1)
+        self.assertEqual(counters[REFRESHED], 1)
+
+    def test_failed_refresh_is_counted(self):
+        """Ошибка фонового обновления учитывается и снимает блокировку."""
+        with mock.patch(
+            'posts.caching._render', side_effect=RuntimeError
+        ), self.assertLogs('posts.caching', 'ERROR'):
+            response = self.get_expired()
+        self.assertEqual(response.content, self.response.content)
+        self.assertEqual(metrics('index')[REFRESH_FAILED], 1)
+        lock = _lock_key(RequestFactory().get(self.url), 'index')
+        self.assertIsNone(cache.get(lock))
+
+    def test_refreshes_over_the_cap_are_dropped(self):
+        """Сверх лимита одновременных обновлений задачи не ставятся."""
+        slots = threading.BoundedSemaphore(1)
+        slots.acquire()
+        with mock.patch('posts.caching._refresh_slots', slots):
+            response = self.get_expired()
+        self.assertEqual(response.content, self.response.content)
+        self.assertEqual(metrics('index')[REFRESH_DROPPED], 1)
+        self.assertEqual(metrics('index')[REFRESHED], 0)
+
+    def test_cache_metrics_command(self):
+        """Команда cache_metrics печатает метрики кеша."""
+        self.get_expired()
+        out = StringIO()
+        call_command('cache_metrics', 'index', stdout=out)
+        self.assertIn('stale_served=1', out.getvalue())
@@ -0,0 +1,73 @@
+from http import HTTPStatus
+
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from ..models import Comment, Post, User
+from ..views import NUMBER_OF_DISPLAYED_COMMENTS
+
+NUMBER_OF_COMMENTS = NUMBER_OF_DISPLAYED_COMMENTS + 5
+
+
+class CommentsPaginationTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.post = Post.objects.create(text='Пост', author=cls.author)
+        commentators = [
+            User.objects.create_user(username=f'commentator_{i}')
+            for i in range(3)
+        ]
+        for i in range(NUMBER_OF_COMMENTS):
+            Comment.objects.create(
+                text=f'Комментарий №{i}',
+                post=cls.post,
+                author=commentators[i % len(commentators)],
+            )
+        cls.detail_url = reverse(
+            'posts:post_detail', kwargs={'post_id': cls.post.id}
+        )
+        cls.comments_url = reverse(
+            'posts:post_comments', kwargs={'post_id': cls.post.id}
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_post_detail_shows_first_batch(self):
+        """Страница поста показывает только первую порцию комментариев"""
+        response = self.client.get(self.detail_url)
+        comments_page = response.context['comments_page']
+        self.assertEqual(len(comments_page), NUMBER_OF_DISPLAYED_COMMENTS)
+        self.assertTrue(comments_page.has_next())
+        self.assertContains(response, 'js-more-comments')
+
+    def test_comments_endpoint_returns_next_batch(self):
+        """Фрагмент со следующей порцией продолжает список комментариев"""
+        first_page = self.client.get(
+            self.detail_url
+        ).context['comments_page']
+        response = self.client.get(
+            self.comments_url, {'cursor': first_page.next_cursor}
+        )
+        self.assertTemplateUsed(response, 'includes/comment_list.html')
+        self.assertNotContains(response, '<html')
+        comments = list(first_page) + list(response.context['comments_page'])
+        self.assertEqual(
+            comments,
+            list(self.post.comments.order_by('-created', '-id'))
+        )
+
+    def test_comment_authors_loaded_in_one_query(self):
+        """Авторы комментариев загружаются вместе с комментариями"""
+        with self.assertNumQueries(2):
+            self.client.get(self.comments_url)
+
+    def test_comments_endpoint_unknown_post(self):
+        """Фрагмент комментариев несуществующего поста возвращает 404"""
+        response = self.client.get(
+            reverse('posts:post_comments', kwargs={'post_id': 0})
+        )
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
@@ -0,0 +1,129 @@
+import gzip
+import unittest
+from unittest import mock
+
+from django.core.cache import cache
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import Client, RequestFactory, TestCase
+from django.urls import reverse
+
+from core import compression
+from core.compression import MIN_SIZE, CompressionMiddleware
+
+from ..models import Post, User
+
+TEXT = ('<p>Тестовый пост</p>' * 200).encode()
+
+
+def compress(response, accept_encoding='gzip, deflate'):
+    request = RequestFactory().get(
+        '/', HTTP_ACCEPT_ENCODING=accept_encoding
+    )
+    return CompressionMiddleware(lambda request: response)(request)
+
+
+class CompressionMiddlewareTests(TestCase):
+    def test_accepted_respects_q_values(self):
+        """Кодировки с q=0 не считаются допустимыми"""
+        request = RequestFactory().get(
+            '/', HTTP_ACCEPT_ENCODING='gzip;q=0, br;q=0.5, identity'
+        )
+        self.assertEqual(compression.accepted(request), {'br', 'identity'})
+        request = RequestFactory().get(
+            '/', HTTP_ACCEPT_ENCODING='*, gzip;q=0'
+        )
+        self.assertEqual(compression.accepted(request), {'*', 'br'})
+
+    def test_gzip(self):
+        """Текстовый ответ сжимается gzip и помечается заголовками"""
+        response = HttpResponse(TEXT)
+        response['ETag'] = '"tag"'
+        response = compress(response)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+        self.assertEqual(response['ETag'], 'W/"tag"')
+        self.assertEqual(
+            int(response['Content-Length']), len(response.content)
+        )
+        self.assertEqual(gzip.decompress(response.content), TEXT)
+
+    def test_not_accepted(self):
+        """Без подходящей Accept-Encoding ответ не сжимается"""
+        response = compress(HttpResponse(TEXT), 'gzip;q=0, identity')
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(response.content, TEXT)
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+
+    def test_skipped(self):
+        """Малые, уже сжатые, частичные и бинарные ответы не сжимаются"""
+        encoded = HttpResponse(TEXT)
+        encoded['Content-Encoding'] = 'br'
+        partial = HttpResponse(TEXT, status=206)
+        partial['Content-Range'] = f'bytes 0-{len(TEXT) - 1}/{len(TEXT)}'
+        for response in (
+            HttpResponse(TEXT[:MIN_SIZE - 1]),
+            encoded,
+            partial,
+            HttpResponse(TEXT, content_type='image/jpeg'),
+        ):
+            with self.subTest(response=response):
+                content = response.content
+                response = compress(response)
+                self.assertEqual(response.content, content)
+                self.assertNotEqual(
+                    response.get('Content-Encoding'), 'gzip'
+                )
+
+    def test_streaming_chunks(self):
+        """Потоковый ответ сжимается по частям, каждая отдается сразу"""
+        chunks = [TEXT[:3000], TEXT[3000:]]
+        response = compress(StreamingHttpResponse(iter(chunks)))
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertFalse(response.has_header('Content-Length'))
+        decompressor = gzip.zlib.decompressobj(16 + gzip.zlib.MAX_WBITS)
+        first = next(iter(response.streaming_content))
+        self.assertEqual(decompressor.decompress(first), chunks[0])
+        body = first + b''.join(response.streaming_content)
+        self.assertEqual(gzip.decompress(body), TEXT)
+
+    @unittest.skipIf(compression.brotli is None, 'brotli is not installed')
+    def test_brotli_preferred(self):
+        """При наличии brotli ему отдается предпочтение перед gzip"""
+        response = compress(HttpResponse(TEXT), 'gzip, br')
+        self.assertEqual(response['Content-Encoding'], 'br')
+
+
+class CachedPageCompressionTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        Post.objects.bulk_create(
+            Post(text=f'Тестовый пост {i}', author=cls.author)
+            for i in range(10)
+        )
+        cls.reader_client = Client(HTTP_ACCEPT_ENCODING='gzip')
+        cls.reader_client.force_login(cls.reader)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_cached_page_compressed_once(self):
+        """Закешированная страница сжимается один раз, а шапка вставляется"""
+        url = reverse('posts:index')
+        anonymous = Client(HTTP_ACCEPT_ENCODING='gzip').get(url)
+        self.assertIn('Sign in', gzip.decompress(anonymous.content).decode())
+        with mock.patch.object(
+            compression, 'compress', side_effect=AssertionError
+        ), mock.patch.object(
+            compression, 'precompress', side_effect=AssertionError
+        ):
+            response = self.reader_client.get(url)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        page = gzip.decompress(response.content).decode()
+        self.assertIn('User: reader', page)
+        self.assertNotIn('Sign in', page)
+        plain = Client()
+        plain.force_login(self.reader)
+        self.assertEqual(page, plain.get(url).content.decode())
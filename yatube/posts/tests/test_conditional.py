@@ -0,0 +1,122 @@
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from ..models import Comment, Follow, Group, Post, User
+
+
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.post = Post.objects.create(
+            text='Тестовый пост', author=cls.author, group=cls.group
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        cls.reader_client = Client()
+        cls.reader_client.force_login(cls.reader)
+
+    def setUp(self):
+        cache.clear()
+
+    def assertNotModified(self, client, url, queries):
+        response = client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('no-cache', response['Cache-Control'])
+        etag = response['ETag']
+        with self.assertNumQueries(queries):
+            response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.templates, [])
+        return etag
+
+    def test_repeat_visit_is_not_modified(self):
+        """Повторный запрос с ETag получает 304 без шаблонов и постов"""
+        # Анонимному клиенту хватает кеша, залогиненному нужны сессия
+        # и пользователь, странице поста еще и автор
+        cases = [
+            (self.client, reverse('posts:index'), 0),
+            (
+                self.client,
+                reverse('posts:group_list', kwargs={'slug': 'test-slug'}),
+                0,
+            ),
+            (
+                self.client,
+                reverse('posts:profile', kwargs={'username': 'author'}),
+                0,
+            ),
+            (
+                self.client,
+                reverse('posts:post_detail', kwargs={'post_id': self.post.id}),
+                1,
+            ),
+            (self.reader_client, reverse('posts:follow_index'), 3),
+        ]
+        for client, url, queries in cases:
+            with self.subTest(url=url):
+                self.assertNotModified(client, url, queries)
+
+    def test_changes_produce_new_etag(self):
+        """После изменений старый ETag больше не подходит"""
+        urls = [
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': 'test-slug'}),
+            reverse('posts:profile', kwargs={'username': 'author'}),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id}),
+            reverse('posts:follow_index'),
+        ]
+        etags = {
+            url: self.reader_client.get(url)['ETag'] for url in urls
+        }
+        self.post.text = 'Измененный пост'
+        self.post.save()
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.reader_client.get(
+                    url, HTTP_IF_NONE_MATCH=etags[url]
+                )
+                self.assertEqual(response.status_code, 200)
+
+    def test_comment_changes_post_etag(self):
+        """Новый комментарий меняет ETag страницы поста"""
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.id})
+        etag = self.client.get(url)['ETag']
+        Comment.objects.create(
+            text='Комментарий', post=self.post, author=self.reader
+        )
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_unfollow_changes_follow_etag(self):
+        """Отписка меняет ETag страницы подписок"""
+        url = reverse('posts:follow_index')
+        etag = self.reader_client.get(url)['ETag']
+        Follow.objects.filter(user=self.reader).delete()
+        response = self.reader_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_follow_changes_follower_profile(self):
+        """Подписка меняет счетчик подписок в профиле подписчика"""
+        url = reverse('posts:profile', kwargs={'username': 'reader'})
+        response = self.client.get(url)
+        self.assertContains(response, 'Following: 1')
+        other = User.objects.create_user(username='other')
+        Follow.objects.create(user=self.reader, author=other)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Following: 2')
+
+    def test_etag_depends_on_user(self):
+        """ETag анонима не подходит залогиненному пользователю"""
+        url = reverse('posts:index')
+        etag = self.client.get(url)['ETag']
+        response = self.reader_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
@@ -0,0 +1,131 @@
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from ..models import Comment, Follow, Group, Post, User, UserCounters
+
+
+class CountersTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.other_group = Group.objects.create(
+            title='Другая группа',
+            slug='other-slug',
+            description='Другое описание',
+        )
+        cls.author_client = Client()
+        cls.author_client.force_login(cls.author)
+        cls.reader_client = Client()
+        cls.reader_client.force_login(cls.reader)
+
+    def setUp(self):
+        cache.clear()
+
+    def counters(self, user):
+        return UserCounters.objects.get(user=user)
+
+    def test_post_create_and_delete_change_counters(self):
+        """Создание и удаление поста меняют счетчики автора и группы"""
+        self.author_client.post(
+            reverse('posts:post_create'),
+            data={'text': 'Новый пост', 'group': self.group.id},
+        )
+        post = Post.objects.get(text='Новый пост')
+        self.group.refresh_from_db()
+        self.assertEqual(self.counters(self.author).posts_count, 1)
+        self.assertEqual(self.group.posts_count, 1)
+        self.author_client.post(
+            reverse('posts:post_delete', kwargs={'post_id': post.id})
+        )
+        self.group.refresh_from_db()
+        self.assertFalse(Post.objects.filter(id=post.id).exists())
+        self.assertEqual(self.counters(self.author).posts_count, 0)
+        self.assertEqual(self.group.posts_count, 0)
+
+    def test_post_edit_moves_group_counter(self):
+        """Смена группы при редактировании переносит счетчик постов"""
+        post = Post.objects.create(
+            text='Пост', author=self.author, group=self.group
+        )
+        self.author_client.post(
+            reverse('posts:post_edit', kwargs={'post_id': post.id}),
+            data={'text': 'Пост', 'group': self.other_group.id},
+        )
+        self.group.refresh_from_db()
+        self.other_group.refresh_from_db()
+        self.assertEqual(self.group.posts_count, 0)
+        self.assertEqual(self.other_group.posts_count, 1)
+
+    def test_comment_changes_post_counter(self):
+        """Комментарий увеличивает счетчик комментариев поста"""
+        post = Post.objects.create(text='Пост', author=self.author)
+        self.reader_client.post(
+            reverse('posts:add_comment', kwargs={'post_id': post.id}),
+            data={'text': 'Комментарий'},
+        )
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+
+    def test_follow_changes_user_counters(self):
+        """Подписка и отписка меняют счетчики подписчиков и подписок"""
+        follow_url = reverse(
+            'posts:profile_follow', kwargs={'username': 'author'}
+        )
+        self.reader_client.get(follow_url)
+        self.reader_client.get(follow_url)
+        self.assertEqual(self.counters(self.author).followers_count, 1)
+        self.assertEqual(self.counters(self.reader).following_count, 1)
+        self.reader_client.get(
+            reverse('posts:profile_unfollow', kwargs={'username': 'author'})
+        )
+        self.assertEqual(self.counters(self.author).followers_count, 0)
+        self.assertEqual(self.counters(self.reader).following_count, 0)
+
+    def test_profile_does_not_count_posts(self):
+        """Профиль берет число постов из счетчика, без COUNT(*)"""
+        Post.objects.create(text='Пост', author=self.author)
+        with self.assertNumQueries(2):
+            response = self.client.get(
+                reverse('posts:profile', kwargs={'username': 'author'})
+            )
+        self.assertEqual(response.context['count'], 1)
+
+    def test_reconcile_counters_repairs_drift(self):
+        """Команда reconcile_counters исправляет разошедшиеся счетчики"""
+        post = Post.objects.create(
+            text='Пост', author=self.author, group=self.group
+        )
+        Comment.objects.create(
+            text='Комментарий', post=post, author=self.reader
+        )
+        Follow.objects.create(user=self.reader, author=self.author)
+        UserCounters.objects.update(
+            posts_count=7, followers_count=7, following_count=7
+        )
+        UserCounters.objects.filter(user=self.reader).delete()
+        Group.objects.update(posts_count=7)
+        Post.objects.update(comments_count=7)
+        call_command('reconcile_counters', batch_size=1, stdout=StringIO())
+        author_counters = self.counters(self.author)
+        reader_counters = self.counters(self.reader)
+        self.group.refresh_from_db()
+        self.other_group.refresh_from_db()
+        post.refresh_from_db()
+        self.assertEqual(author_counters.posts_count, 1)
+        self.assertEqual(author_counters.followers_count, 1)
+        self.assertEqual(reader_counters.following_count, 1)
+        self.assertEqual(reader_counters.posts_count, 0)
+        self.assertEqual(self.group.posts_count, 1)
+        self.assertEqual(self.other_group.posts_count, 0)
+        self.assertEqual(post.comments_count, 1)
@@ -4,10 +4,13 @@ from multiprocessing.connection import Client
 from random import randint
 
 from django.conf import settings
+from django.core.files.base import ContentFile
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
 
+from core.storage import content_name
+
 from ..models import Group, Post, User
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
@@ -44,7 +47,12 @@ class PostCreateEditFormTests(TestCase):
         self.assertEqual(source_post.text, form_data['text'])
         self.assertEqual(source_post.author, self.user)
         self.assertEqual(source_post.group, self.group)
-        self.assertEqual(source_post.image.name, f'posts/{uploaded.name}')
+        self.assertEqual(
+            source_post.image.name,
+            content_name(
+                f'posts/{uploaded.name}', ContentFile(self.small_gif)
+            ),
+        )
 
     @classmethod
     def tearDownClass(cls):
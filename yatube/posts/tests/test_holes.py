@@ -0,0 +1,95 @@
+import re
+
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from ..models import Comment, Follow, Post, User
+
+
+class HolePunchingTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        Post.objects.create(text='Тестовый пост', author=cls.author)
+        cls.reader_client = Client()
+        cls.reader_client.force_login(cls.reader)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_one_cached_page_serves_all_users(self):
+        """Одна закешированная страница отдается всем с их шапкой"""
+        url = reverse('posts:index')
+        anonymous = self.client.get(url)
+        self.assertContains(anonymous, 'Sign in')
+        response = self.reader_client.get(url)
+        self.assertNotIn('page_obj', response.context)
+        self.assertContains(response, 'User: reader')
+        self.assertContains(response, 'Subscriptions')
+        self.assertNotContains(response, 'Sign in')
+
+    def test_follow_button_is_personal(self):
+        """Кнопка подписки на общей странице профиля своя у каждого"""
+        Follow.objects.create(user=self.reader, author=self.author)
+        url = reverse('posts:profile', kwargs={'username': 'author'})
+        self.assertContains(self.client.get(url), 'subscribe')
+        response = self.reader_client.get(url)
+        self.assertNotIn('page_obj', response.context)
+        self.assertContains(response, 'unsubscribe')
+        author_client = Client()
+        author_client.force_login(self.author)
+        self.assertNotContains(author_client.get(url), 'subscribe')
+
+    def test_marker_in_post_text_is_not_filled(self):
+        """Маркер в тексте поста экранируется и не заполняется"""
+        Post.objects.create(text='<!--hole:header-->', author=self.author)
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, '<header>', count=1)
+
+
+class CachedPostDetailTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.post = Post.objects.create(text='Тестовый пост', author=cls.author)
+        cls.url = reverse('posts:post_detail', kwargs={'post_id': cls.post.id})
+
+    def setUp(self):
+        cache.clear()
+
+    def test_cached_page_gets_session_csrf_token(self):
+        """Форма комментария на общей странице работает с CSRF-проверкой"""
+        author_client = Client()
+        author_client.force_login(self.author)
+        author_client.get(self.url)
+        reader_client = Client(enforce_csrf_checks=True)
+        reader_client.force_login(self.reader)
+        response = reader_client.get(self.url)
+        self.assertNotIn('post', response.context)
+        token = re.search(
+            r'name="csrfmiddlewaretoken" value="([^"]+)"',
+            response.content.decode(),
+        ).group(1)
+        response = reader_client.post(
+            reverse('posts:add_comment', kwargs={'post_id': self.post.id}),
+            {'text': 'Комментарий', 'csrfmiddlewaretoken': token},
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(Comment.objects.filter(text='Комментарий').exists())
+        self.assertContains(reader_client.get(self.url), 'Комментарий')
+
+    def test_edit_refreshes_cached_page(self):
+        """Редактирование поста сбрасывает кеш его страницы"""
+        self.client.get(self.url)
+        author_client = Client()
+        author_client.force_login(self.author)
+        author_client.post(
+            reverse('posts:post_edit', kwargs={'post_id': self.post.id}),
+            {'text': 'Измененный пост'},
+        )
+        self.assertContains(self.client.get(self.url), 'Измененный пост')
@@ -0,0 +1,111 @@
+from unittest import skipUnless
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..models import Comment, Follow, Group, Post, User
+from ..views import NUMBER_OF_DISPLAYED_COMMENTS, NUMBER_OF_DISPLAYED_ITEMS
+
+NUMBER_OF_POSTS = NUMBER_OF_DISPLAYED_ITEMS + NUMBER_OF_DISPLAYED_COMMENTS
+
+
+@skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN is SQLite')
+@override_settings(FEED_PULL_THRESHOLD=1)
+class FeedIndexesTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.star = User.objects.create_user(username='star')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.fan = User.objects.create_user(username='fan')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        Follow.objects.create(user=cls.reader, author=cls.star)
+        Follow.objects.create(user=cls.fan, author=cls.star)
+        for i in range(NUMBER_OF_POSTS):
+            cls.post = Post.objects.create(
+                text=f'Пост №{i}',
+                author=cls.author if i % 2 else cls.star,
+                group=cls.group,
+            )
+            Comment.objects.create(
+                text=f'Комментарий №{i}', post=cls.post, author=cls.reader
+            )
+        cls.reader_client = Client()
+        cls.reader_client.force_login(cls.reader)
+
+    def setUp(self):
+        cache.clear()
+
+    def query_plans(self, url, **params):
+        """Планы всех отсортированных запросов, выполненных страницей"""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.reader_client.get(url, params)
+        plans = []
+        with connection.cursor() as cursor:
+            for query in queries.captured_queries:
+                if 'ORDER BY' not in query['sql']:
+                    continue
+                cursor.execute(f'EXPLAIN QUERY PLAN {query["sql"]}')
+                plans.append(' | '.join(row[-1] for row in cursor.fetchall()))
+        return response, plans
+
+    def assert_uses_index(self, url, index, page='page_obj'):
+        response, plans = self.query_plans(url)
+        cursor = response.context[page].next_cursor
+        self.assertIsNotNone(cursor)
+        cache.clear()
+        _, next_plans = self.query_plans(url, cursor=cursor)
+        for plan in plans + next_plans:
+            with self.subTest(url=url, plan=plan):
+                self.assertNotIn('TEMP B-TREE', plan)
+        self.assertTrue(
+            any(index in plan for plan in plans),
+            f'{url} does not use {index}: {plans}'
+        )
+        self.assertTrue(any(index in plan for plan in next_plans))
+
+    def test_index_uses_pub_date_index(self):
+        """Главная страница читает посты по индексу даты публикации"""
+        self.assert_uses_index(reverse('posts:index'), 'post_pub_date_idx')
+
+    def test_group_list_uses_group_index(self):
+        """Страница группы читает посты по индексу (group, pub_date)"""
+        self.assert_uses_index(
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            'post_group_pub_date_idx',
+        )
+
+    def test_profile_uses_author_index(self):
+        """Профиль читает посты по индексу (author, pub_date)"""
+        self.assert_uses_index(
+            reverse('posts:profile', kwargs={'username': 'author'}),
+            'post_author_pub_date_idx',
+        )
+
+    def test_post_detail_uses_comment_index(self):
+        """Комментарии поста читаются по индексу (post, created)"""
+        post = Post.objects.create(text='Пост', author=self.author)
+        for i in range(NUMBER_OF_DISPLAYED_COMMENTS + 1):
+            Comment.objects.create(
+                text=f'Комментарий №{i}', post=post, author=self.reader
+            )
+        self.assert_uses_index(
+            reverse('posts:post_detail', kwargs={'post_id': post.id}),
+            'comment_post_created_idx',
+            page='comments_page',
+        )
+
+    def test_follow_index_uses_timeline_and_author_indexes(self):
+        """Подписки читают ленту и посты популярных авторов по индексам"""
+        url = reverse('posts:follow_index')
+        self.assert_uses_index(url, 'timeline_user_post_date_idx')
+        self.assert_uses_index(url, 'post_author_pub_date_idx')
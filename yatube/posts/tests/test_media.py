@@ -0,0 +1,155 @@
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.test import Client, RequestFactory, TestCase, override_settings
+from django.urls import reverse
+from django.utils.http import http_date
+
+from core import media
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+CONTENT = bytes(range(256)) * 4
+HASHED = 'posts/ab/' + 'ab' * 32 + '.jpg'
+PLAIN = 'posts/photo.jpg'
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class MediaTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        for name in (HASHED, PLAIN):
+            path = os.path.join(TEMP_MEDIA_ROOT, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as file_:
+                file_.write(CONTENT)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.client = Client()
+
+    def get(self, name, **headers):
+        response = self.client.get(
+            reverse('media', kwargs={'path': name}), **headers
+        )
+        self.addCleanup(response.close)
+        return response
+
+    def content(self, response):
+        return b''.join(response.streaming_content)
+
+    def test_hashed_file_is_immutable(self):
+        """Файл с хешем в имени кешируется на год без перепроверки"""
+        response = self.get(HASHED)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        self.assertEqual(response['Content-Length'], str(len(CONTENT)))
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertIn('max-age=31536000', response['Cache-Control'])
+        self.assertEqual(self.content(response), CONTENT)
+
+    def test_plain_file_is_revalidated(self):
+        """Файл без хеша в имени кешируется ненадолго"""
+        response = self.get(PLAIN)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('immutable', response['Cache-Control'])
+        self.assertIn('max-age=3600', response['Cache-Control'])
+
+    def test_file_is_streamed_for_sendfile(self):
+        """Django отдает открытый файл, который сервер может отправить сам"""
+        # Клиент тестов оборачивает содержимое ответа, поэтому без него
+        response = media.serve(RequestFactory().get('/'), HASHED)
+        self.addCleanup(response.close)
+        self.assertEqual(response.file_to_stream.name, os.path.join(
+            TEMP_MEDIA_ROOT, HASHED
+        ))
+
+    def test_not_modified(self):
+        """Неизмененный файл отдается ответом 304"""
+        mtime = os.stat(os.path.join(TEMP_MEDIA_ROOT, PLAIN)).st_mtime
+        response = self.get(
+            PLAIN, HTTP_IF_MODIFIED_SINCE=http_date(mtime + 1)
+        )
+        self.assertEqual(response.status_code, 304)
+
+    def test_ranges(self):
+        """Запрос части файла получает ответ 206 с этой частью"""
+        size = len(CONTENT)
+        cases = {
+            'bytes=10-19': (10, 19),
+            'bytes=1000-': (1000, size - 1),
+            'bytes=-24': (size - 24, size - 1),
+            'bytes=1000-5000': (1000, size - 1),
+        }
+        for header, (first, last) in cases.items():
+            with self.subTest(range=header):
+                response = self.get(HASHED, HTTP_RANGE=header)
+                self.assertEqual(response.status_code, 206)
+                self.assertEqual(
+                    response['Content-Range'], f'bytes {first}-{last}/{size}'
+                )
+                self.assertEqual(
+                    response['Content-Length'], str(last - first + 1)
+                )
+                self.assertEqual(
+                    self.content(response), CONTENT[first:last + 1]
+                )
+
+    def test_unsatisfiable_range(self):
+        """Часть за концом файла отклоняется ответом 416"""
+        response = self.get(HASHED, HTTP_RANGE=f'bytes={len(CONTENT)}-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], f'bytes */{len(CONTENT)}')
+
+    def test_full_file_instead_of_range(self):
+        """Несколько частей или устаревший If-Range получают весь файл"""
+        for headers in (
+            {'HTTP_RANGE': 'bytes=0-1,5-6'},
+            {
+                'HTTP_RANGE': 'bytes=0-1',
+                'HTTP_IF_RANGE': 'Mon, 01 Jan 2001 00:00:00 GMT',
+            },
+        ):
+            with self.subTest(headers=headers):
+                response = self.get(HASHED, **headers)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(self.content(response), CONTENT)
+
+    @override_settings(MEDIA_SENDFILE='x-sendfile')
+    def test_x_sendfile(self):
+        """С X-Sendfile файл отправляет фронтенд-сервер"""
+        response = self.get(HASHED)
+        self.assertEqual(
+            response['X-Sendfile'], os.path.join(TEMP_MEDIA_ROOT, HASHED)
+        )
+        self.assertEqual(response.content, b'')
+        self.assertIn('immutable', response['Cache-Control'])
+
+    @override_settings(
+        MEDIA_SENDFILE='x-accel-redirect', MEDIA_ACCEL_PREFIX='/internal/'
+    )
+    def test_x_accel_redirect(self):
+        """С X-Accel-Redirect файл отправляет nginx из internal location"""
+        response = self.get(HASHED)
+        self.assertEqual(response['X-Accel-Redirect'], f'/internal/{HASHED}')
+        self.assertEqual(response.content, b'')
+
+    def test_missing_files(self):
+        """Несуществующие файлы, каталоги и пути за MEDIA_ROOT не отдаются"""
+        for name in ('posts/missing.jpg', 'posts', '../settings.py'):
+            with self.subTest(name=name):
+                self.assertEqual(self.get(name).status_code, 404)
+
+    def test_only_safe_methods(self):
+        """Медиафайлы можно только читать"""
+        response = self.client.post(
+            reverse('media', kwargs={'path': HASHED})
+        )
+        self.assertEqual(response.status_code, 405)
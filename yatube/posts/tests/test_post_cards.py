@@ -0,0 +1,75 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from ..models import Group, Post, User
+from ..templatetags.post_cards import card_key, post_cards
+
+
+class PostCardsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        for i in range(3):
+            Post.objects.create(
+                text=f'Пост №{i}', author=cls.author, group=cls.group
+            )
+
+    def setUp(self):
+        cache.clear()
+
+    def posts(self):
+        return list(Post.objects.select_related('author', 'group'))
+
+    def test_page_reads_cards_with_one_get_many(self):
+        """Страница ленты получает все карточки одним get_many"""
+        for url in (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': 'test-slug'}),
+            reverse('posts:profile', kwargs={'username': 'author'}),
+        ):
+            with self.subTest(url=url):
+                cache.clear()
+                with mock.patch.object(
+                    cache, 'get_many', wraps=cache.get_many
+                ) as get_many:
+                    self.client.get(url)
+                card_calls = [
+                    call for call in get_many.call_args_list
+                    if any(
+                        key.startswith('post_card') for key in call.args[0]
+                    )
+                ]
+                self.assertEqual(len(card_calls), 1)
+                self.assertEqual(len(list(card_calls[0].args[0])), 3)
+
+    def test_cached_card_is_not_rendered_again(self):
+        """Закешированная карточка не рендерится повторно"""
+        post_cards(self.posts())
+        with mock.patch(
+            'posts.templatetags.post_cards.render_to_string'
+        ) as render:
+            cards = post_cards(self.posts())
+        render.assert_not_called()
+        self.assertIn('Пост №2', cards[0])
+
+    def test_edit_changes_card_key(self):
+        """Редактирование поста меняет ключ его карточки"""
+        post = self.posts()[0]
+        old_key = card_key(post)
+        self.client.force_login(self.author)
+        self.client.post(
+            reverse('posts:post_edit', kwargs={'post_id': post.id}),
+            data={'text': 'Новый текст', 'group': self.group.id},
+        )
+        post = self.posts()[0]
+        self.assertNotEqual(card_key(post), old_key)
+        self.assertIn('Новый текст', post_cards([post])[0])
@@ -0,0 +1,188 @@
+import logging
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.http import HttpResponse
+from django.test import Client, RequestFactory, TestCase, override_settings
+from django.urls import reverse
+
+from core.query_budget import QueryBudgetExceeded, query_budget
+
+from ..models import (Comment, Follow, Group, Post, PulledAuthor,
+                      TimelineEntry, User)
+from ..views import NUMBER_OF_DISPLAYED_ITEMS
+from .utils import QueryBudgetTestMixin
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+@query_budget(1)
+def two_queries_view(request):
+    list(User.objects.all())
+    list(Group.objects.all())
+    return HttpResponse()
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class QueryBudgetTests(QueryBudgetTestMixin, TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        for i in range(NUMBER_OF_DISPLAYED_ITEMS + 1):
+            author = User.objects.create_user(username=f'author_{i}')
+            group = Group.objects.create(
+                title=f'Группа №{i}',
+                slug=f'group-{i}',
+                description='Описание',
+            )
+            post = Post.objects.create(
+                text=f'Пост №{i}', author=author, group=group
+            )
+            Comment.objects.create(
+                text='Комментарий', post=post, author=author
+            )
+            Follow.objects.create(user=cls.reader, author=author)
+        cls.post = post
+        cls.group = group
+        cls.other_group = Group.objects.get(slug='group-0')
+        cls.author = author
+        cls.reader_client = Client()
+        cls.reader_client.force_login(cls.reader)
+        cls.author_client = Client()
+        cls.author_client.force_login(author)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_read_views_stay_within_budget(self):
+        """Страницы не выходят за объявленный бюджет SQL-запросов"""
+        urls = [
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse(
+                'posts:profile', kwargs={'username': self.author.username}
+            ),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id}),
+            reverse('posts:post_comments', kwargs={'post_id': self.post.id}),
+            reverse('posts:follow_index'),
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertWithinQueryBudget(self.reader_client, url)
+
+    def test_feed_queries_do_not_grow_with_page(self):
+        """Число запросов ленты не зависит от числа постов на странице"""
+        self.assertWithinQueryBudget(self.client, reverse('posts:index'))
+        Post.objects.exclude(id=self.post.id).delete()
+        cache.clear()
+        self.assertWithinQueryBudget(self.client, reverse('posts:index'))
+
+    def test_write_views_stay_within_budget(self):
+        """Изменяющие страницы не выходят за бюджет SQL-запросов"""
+        requests = [
+            (reverse('posts:post_create'), {'text': 'Новый пост'}),
+            (
+                reverse('posts:post_edit', kwargs={'post_id': self.post.id}),
+                {'text': 'Новый текст', 'group': self.group.id},
+            ),
+            (
+                reverse('posts:add_comment', kwargs={'post_id': self.post.id}),
+                {'text': 'Новый комментарий'},
+            ),
+        ]
+        for url, data in requests:
+            with self.subTest(url=url):
+                self.assertWithinQueryBudget(
+                    self.author_client, url, method='post', data=data
+                )
+        urls = [
+            reverse('posts:profile_follow', kwargs={'username': 'reader'}),
+            reverse('posts:profile_unfollow', kwargs={'username': 'reader'}),
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertWithinQueryBudget(self.author_client, url)
+        self.assertWithinQueryBudget(
+            self.author_client,
+            reverse('posts:post_delete', kwargs={'post_id': self.post.id}),
+            method='post',
+        )
+
+    def test_follow_index_with_pulled_authors_stays_within_budget(self):
+        """Посты популярных авторов читаются в ленту одним запросом"""
+        url = reverse('posts:follow_index')
+        pulled = User.objects.filter(
+            username__in=['author_1', 'author_2', 'author_3']
+        )
+        PulledAuthor.objects.bulk_create(
+            PulledAuthor(author=author) for author in pulled
+        )
+        TimelineEntry.objects.filter(author__in=pulled).delete()
+        response = self.assertWithinQueryBudget(self.reader_client, url)
+        self.assertEqual(
+            [post.text for post in response.context['page_obj']],
+            [f'Пост №{i}' for i in range(NUMBER_OF_DISPLAYED_ITEMS, 0, -1)],
+        )
+        PulledAuthor.objects.create(author=self.author)
+        cache.clear()
+        self.assertWithinQueryBudget(self.reader_client, url)
+
+    def test_write_views_with_group_and_image_stay_within_budget(self):
+        """Посты с группой и картинкой укладываются в бюджет запросов"""
+        requests = [
+            (
+                reverse('posts:post_create'),
+                {'text': 'Новый пост', 'group': self.group.id},
+            ),
+            (
+                reverse('posts:post_create'),
+                {'text': 'Пост с картинкой', 'group': self.group.id},
+                'small.gif',
+            ),
+            (
+                reverse('posts:post_edit', kwargs={'post_id': self.post.id}),
+                {'text': 'Новый текст', 'group': self.other_group.id},
+                'other.gif',
+            ),
+        ]
+        for url, data, *image in requests:
+            if image:
+                data['image'] = SimpleUploadedFile(
+                    image[0], SMALL_GIF + image[0].encode(), 'image/gif'
+                )
+            with self.subTest(url=url, data=data):
+                self.assertWithinQueryBudget(
+                    self.author_client, url, method='post', data=data
+                )
+
+    @override_settings(QUERY_BUDGET_STRICT=True)
+    def test_strict_budget_raises(self):
+        """В строгом режиме превышение бюджета вызывает исключение"""
+        request = RequestFactory().get('/')
+        with self.assertRaises(QueryBudgetExceeded):
+            two_queries_view(request)
+
+    @override_settings(QUERY_BUDGET_STRICT=False)
+    def test_budget_overrun_is_logged(self):
+        """Без строгого режима превышение бюджета попадает в лог"""
+        request = RequestFactory().get('/')
+        with self.assertLogs('core.query_budget', logging.WARNING) as logs:
+            two_queries_view(request)
+        self.assertIn('ran 2 queries, budget is 1', logs.output[0])
@@ -0,0 +1,103 @@
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from core.cache import SQLiteCache
+
+
+def incr_many(location, times):
+    cache = SQLiteCache(location, {})
+    for _ in range(times):
+        cache.incr('counter')
+
+
+class SQLiteCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.location = os.path.join(self.directory, 'cache.sqlite3')
+        self.cache = self.make_cache()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def make_cache(self, **options):
+        return SQLiteCache(self.location, {'OPTIONS': options})
+
+    def test_set_get_delete(self):
+        """Запись читается, перезаписывается и удаляется"""
+        self.cache.set('key', {'value': 1})
+        self.assertEqual(self.cache.get('key'), {'value': 1})
+        self.cache.set('key', 'новое значение')
+        self.assertEqual(self.cache.get('key'), 'новое значение')
+        self.cache.delete('key')
+        self.assertIsNone(self.cache.get('key'))
+
+    def test_entries_are_shared_between_instances(self):
+        """Записи одного экземпляра видны другому, как другим воркерам"""
+        self.cache.set('key', 'value')
+        self.assertEqual(self.make_cache().get('key'), 'value')
+
+    def test_expired_entry_is_missing(self):
+        """Просроченная запись не читается и не мешает add"""
+        self.cache.set('key', 'value', timeout=10)
+        with mock.patch('core.cache.time.time', return_value=time.time() + 20):
+            self.assertIsNone(self.cache.get('key'))
+            self.assertTrue(self.cache.add('key', 'new'))
+            self.assertFalse(self.cache.add('key', 'newer'))
+            self.assertEqual(self.cache.get('key'), 'new')
+
+    def test_many(self):
+        """get_many возвращает только найденные ключи"""
+        self.cache.set_many({'a': 1, 'b': 2})
+        self.assertEqual(
+            self.cache.get_many(['a', 'b', 'c']), {'a': 1, 'b': 2}
+        )
+        self.cache.delete_many(['a', 'b'])
+        self.assertEqual(self.cache.get_many(['a', 'b']), {})
+
+    def test_incr_missing_key_raises(self):
+        """incr отсутствующего ключа вызывает ValueError"""
+        with self.assertRaises(ValueError):
+            self.cache.incr('missing')
+
+    def test_incr_is_atomic_across_processes(self):
+        """Параллельные incr из разных процессов не теряют приращений"""
+        self.cache.set('counter', 0, timeout=None)
+        context = multiprocessing.get_context('fork')
+        workers = [
+            context.Process(target=incr_many, args=(self.location, 50))
+            for _ in range(4)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        self.assertEqual(self.cache.get('counter'), 200)
+
+    def test_lru_eviction_keeps_byte_budget(self):
+        """При превышении бюджета вытесняются давно не читанные записи"""
+        cache = self.make_cache(MAX_BYTES=10_000)
+        value = 'x' * 1000
+        now = time.time()
+        with mock.patch('core.cache.time.time') as clock:
+            clock.return_value = now
+            cache.set('first', value)
+            clock.return_value = now + 1
+            for i in range(8):
+                cache.set(f'key_{i}', value)
+            clock.return_value = now + 2
+            with mock.patch('core.cache.ACCESS_RESOLUTION', 0):
+                cache.get('first')
+            clock.return_value = now + 3
+            for i in range(8, 12):
+                cache.set(f'key_{i}', value)
+        used = cache._db.execute('SELECT size FROM total').fetchone()[0]
+        self.assertLessEqual(used, 10_000)
+        self.assertEqual(cache.get('first'), value)
+        self.assertIsNone(cache.get('key_0'))
+        self.assertEqual(cache.get('key_11'), value)
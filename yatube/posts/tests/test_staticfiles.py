@@ -0,0 +1,123 @@
+import gzip
+import os
+import shutil
+import tempfile
+from unittest import skipUnless
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.cache import cache
+from django.core.management import call_command
+from django.template import Context, Template
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from core import compression
+
+TEMP_STATIC_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+CSS = 'css/bootstrap.min.css'
+LOGO = 'img/logo.png'
+
+
+def render_static(name):
+    return Template('{% load static %}{% static name %}').render(
+        Context({'name': name})
+    )
+
+
+@override_settings(
+    STATIC_ROOT=TEMP_STATIC_ROOT,
+    STATICFILES_FINDERS=[
+        'django.contrib.staticfiles.finders.FileSystemFinder'
+    ],
+)
+class CollectedStaticTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        call_command('collectstatic', interactive=False, verbosity=0)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_STATIC_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+
+    def path(self, name):
+        return os.path.join(TEMP_STATIC_ROOT, name)
+
+    def get(self, name, **headers):
+        response = self.client.get(
+            reverse('static', kwargs={'path': name}), **headers
+        )
+        self.addCleanup(response.close)
+        return response
+
+    def test_static_tag_renders_hashed_names(self):
+        """Тег static выдает имя с хешем содержимого"""
+        url = render_static(CSS)
+        name = url[len(settings.STATIC_URL):]
+        self.assertRegex(name, r'^css/bootstrap\.min\.[0-9a-f]{12}\.css$')
+        self.assertTrue(os.path.isfile(self.path(name)))
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, url)
+
+    def test_text_files_are_precompressed(self):
+        """Текстовые файлы сжимаются заранее, картинки остаются как есть"""
+        css = staticfiles_storage.stored_name(CSS)
+        with open(self.path(css), 'rb') as original, gzip.open(
+            self.path(css + '.gz')
+        ) as compressed:
+            self.assertEqual(compressed.read(), original.read())
+        logo = staticfiles_storage.stored_name(LOGO)
+        self.assertFalse(os.path.exists(self.path(logo + '.gz')))
+
+    @skipUnless(compression.brotli, 'brotli is not installed')
+    def test_brotli_copy(self):
+        """С пакетом brotli рядом пишется и копия .br"""
+        css = staticfiles_storage.stored_name(CSS)
+        with open(self.path(css + '.br'), 'rb') as compressed:
+            self.assertTrue(compressed.read())
+
+    def test_hashed_file_is_immutable(self):
+        """Файл с хешем в имени отдается с кешированием на год"""
+        response = self.get(staticfiles_storage.stored_name(LOGO))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'image/png')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertIn('max-age=31536000', response['Cache-Control'])
+        response = self.get(LOGO)
+        self.assertNotIn('immutable', response['Cache-Control'])
+
+    def test_compressed_copy_is_negotiated(self):
+        """Сжатая копия отдается только браузеру, который ее принимает"""
+        css = staticfiles_storage.stored_name(CSS)
+        compressed = self.get(css, HTTP_ACCEPT_ENCODING='deflate, gzip')
+        self.assertEqual(compressed['Content-Encoding'], 'gzip')
+        self.assertEqual(compressed['Content-Type'], 'text/css')
+        self.assertIn('Accept-Encoding', compressed['Vary'])
+        self.assertEqual(
+            int(compressed['Content-Length']),
+            os.path.getsize(self.path(css + '.gz')),
+        )
+        plain = self.get(css)
+        self.assertFalse(plain.has_header('Content-Encoding'))
+        self.assertEqual(
+            int(plain['Content-Length']), os.path.getsize(self.path(css))
+        )
+
+    def test_missing_files(self):
+        """Несуществующие файлы и пути за STATIC_ROOT не отдаются"""
+        for name in ('css/missing.css', 'css', '../settings.py'):
+            with self.subTest(name=name):
+                self.assertEqual(self.get(name).status_code, 404)
+
+
+class UncollectedStaticTests(TestCase):
+    @override_settings(STATIC_ROOT=os.path.join(settings.BASE_DIR, 'none'))
+    def test_names_before_collectstatic(self):
+        """До collectstatic тег static выдает имя без хеша"""
+        self.assertEqual(render_static(CSS), settings.STATIC_URL + CSS)
@@ -0,0 +1,176 @@
+import os
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import Client, TransactionTestCase, override_settings
+from django.urls import reverse
+
+from core.storage import ContentAddressedStorage
+
+from .. import counters
+from ..models import Post, StoredImage, User
+from ..thumbnails import prefetch, ready
+from .test_thumbnails import SMALL_GIF
+from .utils import InlinePool
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ContentAddressedStorageTests(TransactionTestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        patcher = mock.patch(
+            'posts.thumbnails._executor', return_value=InlinePool()
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(shutil.rmtree, TEMP_MEDIA_ROOT, ignore_errors=True)
+        self.author = User.objects.create_user(username='author')
+        self.client = Client()
+        self.client.force_login(self.author)
+
+    def upload(self, name='small.gif', content=SMALL_GIF):
+        return SimpleUploadedFile(
+            name=name, content=content, content_type='image/gif'
+        )
+
+    def create(self, name='small.gif', content=SMALL_GIF):
+        return Post.objects.create(
+            text='Пост', author=self.author, image=self.upload(name, content)
+        )
+
+    def files(self):
+        return sorted(
+            os.path.relpath(os.path.join(root, name), TEMP_MEDIA_ROOT)
+            for root, dirs, names in os.walk(
+                os.path.join(TEMP_MEDIA_ROOT, 'posts')
+            )
+            for name in names
+        )
+
+    def thumbnail_files(self):
+        return sorted(
+            name
+            for root, dirs, names in os.walk(
+                os.path.join(TEMP_MEDIA_ROOT, 'cache')
+            )
+            for name in names
+        )
+
+    def refs(self, post):
+        return StoredImage.objects.get(name=post.image.name).posts_count
+
+    def test_same_content_stored_once(self):
+        """Одинаковые файлы хранятся один раз под хешем содержимого"""
+        storage = ContentAddressedStorage()
+        first = storage.save('posts/first.GIF', ContentFile(SMALL_GIF))
+        second = storage.save('posts/second.gif', ContentFile(SMALL_GIF))
+        other = storage.save('posts/other.gif', ContentFile(SMALL_GIF + b'1'))
+        self.assertEqual(first, second)
+        self.assertNotEqual(first, other)
+        directory, basename = os.path.split(first)
+        self.assertEqual(directory, f'posts/{basename[:2]}')
+        self.assertTrue(basename.endswith('.gif'))
+        self.assertEqual(self.files(), sorted([first, other]))
+
+    def test_posts_share_file_and_count_it(self):
+        """Посты с одной картинкой делят файл и учитываются в счетчике"""
+        first = self.create('first.gif')
+        second = self.create('second.gif')
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertEqual(self.files(), [first.image.name])
+        self.assertEqual(self.refs(first), 2)
+
+    def test_delete_keeps_file_in_use(self):
+        """Файл удаляется вместе с последним постом, который его использует"""
+        first = self.create()
+        second = self.create()
+        name = first.image.name
+        first.delete()
+        self.assertEqual(self.files(), [name])
+        self.assertEqual(StoredImage.objects.get(name=name).posts_count, 1)
+        second.delete()
+        self.assertEqual(self.files(), [])
+        self.assertFalse(StoredImage.objects.filter(name=name).exists())
+
+    def test_delete_removes_thumbnails(self):
+        """С неиспользуемым файлом удаляются и его миниатюры"""
+        post = self.create()
+        self.assertTrue(self.thumbnail_files())
+        post.delete()
+        self.assertEqual(self.thumbnail_files(), [])
+
+    def test_edit_releases_old_image(self):
+        """При замене картинки старый файл удаляется, если он не нужен"""
+        post = self.create()
+        old_name = post.image.name
+        self.client.post(
+            reverse('posts:post_edit', kwargs={'post_id': post.id}),
+            data={
+                'text': 'Пост',
+                'image': self.upload(content=SMALL_GIF + b'1'),
+            },
+        )
+        post.refresh_from_db()
+        self.assertNotEqual(post.image.name, old_name)
+        self.assertEqual(self.files(), [post.image.name])
+        self.assertEqual(self.refs(post), 1)
+        self.assertFalse(StoredImage.objects.filter(name=old_name).exists())
+
+    def test_upload_rewrites_file_deleted_before_counted(self):
+        """Файл, удаленный как ненужный до учета загрузки, пишется заново"""
+        other = self.create()
+        name = other.image.name
+        change_image = counters.change_image
+        deleted = []
+
+        def delete_other_first(image_name, delta):
+            # Пост с тем же файлом удаляется, когда хранилище уже
+            # нашло файл, а новая загрузка еще не учтена
+            if delta > 0 and not deleted:
+                deleted.append(other.delete())
+                self.assertEqual(self.files(), [])
+            change_image(image_name, delta)
+
+        with mock.patch.object(
+            counters, 'change_image', side_effect=delete_other_first
+        ):
+            post = self.create('again.gif')
+        self.assertEqual(post.image.name, name)
+        self.assertEqual(self.files(), [name])
+        self.assertEqual(self.refs(post), 1)
+
+    def test_thumbnails_shared(self):
+        """Пост с уже загруженной картинкой получает готовые миниатюры"""
+        self.create()
+        made = self.thumbnail_files()
+        post = self.create('again.gif')
+        prefetch([post])
+        self.assertTrue(ready(post))
+        self.assertEqual(self.thumbnail_files(), made)
+
+    def test_reconcile_counts_images(self):
+        """Команда reconcile_counters пересчитывает использование файлов"""
+        post = self.create()
+        self.create()
+        untracked = self.create(content=SMALL_GIF + b'1')
+        StoredImage.objects.filter(name=post.image.name).update(
+            posts_count=7
+        )
+        StoredImage.objects.filter(name=untracked.image.name).delete()
+        call_command('reconcile_counters', batch_size=1, stdout=StringIO())
+        self.assertEqual(self.refs(post), 2)
+        self.assertEqual(self.refs(untracked), 1)
@@ -0,0 +1,365 @@
+import shutil
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO, StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import (Client, TestCase, TransactionTestCase,
+                         override_settings)
+from django.urls import reverse
+from PIL import Image
+from sorl.thumbnail import default
+from sorl.thumbnail.base import ThumbnailBackend as SorlThumbnailBackend
+
+from ..models import Post, User
+from ..thumbnails import (CARD_CROP, FORMATS, GEOMETRIES, WIDTHS, Original,
+                          ThumbnailBackend, geometries, prefetch, ready)
+from .utils import InlinePool, done
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ThumbnailsTests(TransactionTestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.pool = InlinePool()
+        patcher = mock.patch(
+            'posts.thumbnails._executor', return_value=self.pool
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.author = User.objects.create_user(username='author')
+        self.client = Client()
+        self.client.force_login(self.author)
+
+    def upload(self, name='small.gif'):
+        return SimpleUploadedFile(
+            name=name, content=SMALL_GIF, content_type='image/gif'
+        )
+
+    def large_upload(self, size=(1400, 1000)):
+        content = BytesIO()
+        Image.new('RGB', size, (255, 0, 0)).save(content, 'PNG')
+        return SimpleUploadedFile(
+            name='large.png',
+            content=content.getvalue(),
+            content_type='image/png',
+        )
+
+    def stored(self, post, geometry, options):
+        backend = ThumbnailBackend()
+        with mock.patch('posts.thumbnails.schedule') as schedule:
+            thumbnail = backend.get_thumbnail(post.image, geometry, **options)
+        return not schedule.called and thumbnail.exists()
+
+    def test_create_makes_every_geometry(self):
+        """После создания поста готовы миниатюры всех размеров шаблонов"""
+        self.client.post(
+            reverse('posts:post_create'),
+            data={'text': 'Пост', 'image': self.large_upload()},
+        )
+        post = Post.objects.get()
+        self.assertEqual(len(self.pool.submitted), 1)
+        for geometry, options in GEOMETRIES:
+            with self.subTest(geometry=geometry, options=options):
+                self.assertTrue(self.stored(post, geometry, options))
+
+    def test_small_image_gets_no_wider_variants(self):
+        """Варианты шире самой картинки не создаются"""
+        self.client.post(
+            reverse('posts:post_create'),
+            data={'text': 'Пост', 'image': self.upload()},
+        )
+        post = Post.objects.get()
+        made = geometries(post.image_width)
+        self.assertEqual(len(made), len(GEOMETRIES) // len(WIDTHS))
+        self.assertEqual(self.pool.submitted[0][1], list(made))
+
+    def test_create_measures_image(self):
+        """Размеры и превью картинки сохраняются вместе с постом"""
+        self.client.post(
+            reverse('posts:post_create'),
+            data={'text': 'Пост', 'image': self.large_upload()},
+        )
+        post = Post.objects.get()
+        self.assertEqual((post.image_width, post.image_height), (1400, 1000))
+        self.assertTrue(
+            post.image_placeholder.startswith('data:image/jpeg;base64,')
+        )
+
+    def test_edit_measures_new_image(self):
+        """Новая картинка при редактировании измеряется заново"""
+        post = Post.objects.create(
+            text='Пост', author=self.author, image=self.upload()
+        )
+        self.assertEqual((post.image_width, post.image_height), (2, 1))
+        self.client.post(
+            reverse('posts:post_edit', kwargs={'post_id': post.id}),
+            data={'text': 'Пост', 'image': self.large_upload()},
+        )
+        post.refresh_from_db()
+        self.assertEqual((post.image_width, post.image_height), (1400, 1000))
+
+    def test_unreadable_image_is_not_measured(self):
+        """Пост с нечитаемой картинкой сохраняется без размеров"""
+        with self.assertLogs('posts.thumbnails', 'ERROR'), mock.patch(
+            'posts.thumbnails.schedule'
+        ):
+            post = Post.objects.create(
+                text='Пост', author=self.author, image='posts/missing.jpg'
+            )
+        post.refresh_from_db()
+        self.assertIsNone(post.image_width)
+        self.assertEqual(post.image_placeholder, '')
+
+    def test_request_does_not_wait_for_thumbnails(self):
+        """Запрос отвечает, не дожидаясь миниатюр из пула"""
+        pool = ThreadPoolExecutor(max_workers=1)
+        self.addCleanup(pool.shutdown)
+        release = threading.Event()
+        # Занимаем единственный поток пула до конца запроса
+        pool.submit(release.wait, 10)
+        with mock.patch('posts.thumbnails._executor', return_value=pool):
+            self.client.post(
+                reverse('posts:post_create'),
+                data={'text': 'Пост', 'image': self.large_upload()},
+            )
+        post = Post.objects.get()
+        self.assertFalse(self.stored(post, *GEOMETRIES[0]))
+        release.set()
+        pool.shutdown(wait=True)
+        for geometry, options in GEOMETRIES:
+            with self.subTest(geometry=geometry, options=options):
+                self.assertTrue(self.stored(post, geometry, options))
+
+    def test_edit_with_new_image_makes_thumbnails(self):
+        """Новая картинка при редактировании тоже уходит в пул"""
+        post = Post.objects.create(text='Пост', author=self.author)
+        self.assertEqual(self.pool.submitted, [])
+        self.client.post(
+            reverse('posts:post_edit', kwargs={'post_id': post.id}),
+            data={'text': 'Пост', 'image': self.upload('other.gif')},
+        )
+        post.refresh_from_db()
+        self.assertEqual(self.pool.submitted[0][0], post.image.name)
+
+    def test_edit_without_new_image_queues_nothing(self):
+        """Правка текста не ставит картинку в очередь повторно"""
+        self.client.post(
+            reverse('posts:post_create'),
+            data={'text': 'Пост', 'image': self.upload()},
+        )
+        post = Post.objects.get()
+        self.client.post(
+            reverse('posts:post_edit', kwargs={'post_id': post.id}),
+            data={'text': 'Новый текст'},
+        )
+        self.assertEqual(len(self.pool.submitted), 1)
+
+    def test_template_does_not_resize(self):
+        """Без готовой миниатюры шаблон получает оригинал"""
+        with mock.patch('posts.thumbnails.schedule'):
+            post = Post.objects.create(
+                text='Пост', author=self.author, image=self.upload()
+            )
+        queued = mock.Mock(**{'submit.return_value': done()})
+        with mock.patch('posts.thumbnails._executor', return_value=queued):
+            with mock.patch.object(default.engine, 'get_image') as get_image:
+                response = self.client.get(reverse(
+                    'posts:post_detail', kwargs={'post_id': post.id}
+                ))
+        get_image.assert_not_called()
+        self.assertContains(response, post.image.url)
+        self.assertContains(response, 'width="700"')
+        queued.submit.assert_called_once()
+
+    def test_picture_offers_every_variant(self):
+        """Шаблон предлагает браузеру все ширины в WebP и JPEG"""
+        self.client.post(
+            reverse('posts:post_create'),
+            data={'text': 'Пост', 'image': self.large_upload()},
+        )
+        post = Post.objects.get()
+        response = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': post.id})
+        )
+        self.assertContains(response, 'type="image/webp"')
+        self.assertContains(response, 'type="image/jpeg"')
+        for width in WIDTHS:
+            with self.subTest(width=width):
+                self.assertContains(response, f'.webp {width}w')
+                self.assertContains(response, f'.jpg {width}w')
+        self.assertNotContains(response, f'src="{post.image.url}"')
+        self.assertContains(response, 'width="700"')
+
+    def test_small_image_is_not_upscaled(self):
+        """Маленькая картинка не увеличивается, а растягивается браузером"""
+        self.client.post(
+            reverse('posts:post_create'),
+            data={'text': 'Пост', 'image': self.upload()},
+        )
+        post = Post.objects.get()
+        response = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': post.id})
+        )
+        self.assertContains(response, '.webp 2w"')
+        self.assertContains(response, 'width="700"')
+        self.assertContains(response, 'height="500"')
+        self.assertContains(response, 'object-fit: cover')
+
+    def test_backfill_makes_missing_variants(self):
+        """Команда измеряет картинки старых постов и создает варианты"""
+        with mock.patch('posts.thumbnails.schedule'):
+            post = Post.objects.create(
+                text='Пост', author=self.author, image=self.upload()
+            )
+        Post.objects.update(
+            image_width=None, image_height=None, image_placeholder=''
+        )
+        out = StringIO()
+        call_command('backfill_image_variants', workers=2, stdout=out)
+        self.assertIn('Images checked: 1', out.getvalue())
+        post.refresh_from_db()
+        self.assertEqual((post.image_width, post.image_height), (2, 1))
+        self.assertTrue(post.image_placeholder)
+        for geometry, options in geometries(post.image_width):
+            with self.subTest(geometry=geometry, options=options):
+                self.assertTrue(self.stored(post, geometry, options))
+
+    def test_cached_pages_refresh_once_thumbnails_are_made(self):
+        """Страницы, закешированные до готовности миниатюр, обновляются"""
+        queued = mock.Mock(**{'submit.return_value': done()})
+        with mock.patch('posts.thumbnails._executor', return_value=queued):
+            self.client.post(
+                reverse('posts:post_create'),
+                data={'text': 'Пост', 'image': self.large_upload()},
+            )
+            response = self.client.get(reverse('posts:index'))
+        post = Post.objects.get()
+        self.assertContains(response, f'src="{post.image.url}"')
+        generate, *args = queued.submit.call_args[0]
+        generate(*args)
+        response = self.client.get(
+            reverse('posts:index'), HTTP_IF_NONE_MATCH=response['ETag']
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertNotContains(response, f'src="{post.image.url}"')
+        self.assertContains(response, '.webp 350w')
+
+    def test_narrow_image_ready_once_its_variants_are_made(self):
+        """Картинка уже самой широкой миниатюры готова без нее"""
+        self.client.post(
+            reverse('posts:post_create'),
+            data={'text': 'Пост', 'image': self.large_upload((800, 600))},
+        )
+        post = Post.objects.get()
+        prefetch([post], [CARD_CROP])
+        self.assertTrue(ready(post))
+        self.assertEqual(len(post._thumbnails), len(FORMATS) * 2)
+
+    def test_missing_thumbnail_queued_once(self):
+        """Недостающая миниатюра не ставится в очередь повторно"""
+        with mock.patch('posts.thumbnails.schedule'):
+            post = Post.objects.create(
+                text='Пост', author=self.author, image=self.upload()
+            )
+        geometry, options = GEOMETRIES[0]
+        queued = mock.Mock(**{'submit.return_value': done()})
+        with mock.patch('posts.thumbnails._executor', return_value=queued):
+            for _ in range(2):
+                thumbnail = ThumbnailBackend().get_thumbnail(
+                    post.image, geometry, **options
+                )
+        self.assertEqual(thumbnail.url, post.image.url)
+        queued.submit.assert_called_once()
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class PrefetchTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.posts = [
+            Post.objects.create(
+                text=f'Пост {i}',
+                author=cls.author,
+                image=SimpleUploadedFile(
+                    name=f'prefetch_{i}.gif',
+                    # Байты после конца GIF делают картинки разными
+                    content=SMALL_GIF + bytes([i]),
+                    content_type='image/gif',
+                ),
+            )
+            for i in range(3)
+        ]
+        cls.posts.append(
+            Post.objects.create(text='Без картинки', author=cls.author)
+        )
+        geometry, options = GEOMETRIES[0]
+        for post in cls.posts[:2]:
+            SorlThumbnailBackend().get_thumbnail(
+                post.image, geometry, **options
+            )
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+
+    def thumbnails(self, posts):
+        geometry, options = GEOMETRIES[0]
+        return [
+            ThumbnailBackend().get_thumbnail(post.image, geometry, **options)
+            for post in posts if post.image
+        ]
+
+    def test_one_query_per_page(self):
+        """Миниатюры страницы ищутся одним запросом, а теги не ищут их"""
+        posts = list(Post.objects.order_by('id'))
+        with self.assertNumQueries(1):
+            prefetch(posts)
+        with mock.patch('posts.thumbnails.schedule') as schedule:
+            with self.assertNumQueries(0):
+                made, also_made, missing = self.thumbnails(posts)
+        self.assertNotIsInstance(made, Original)
+        self.assertNotIsInstance(also_made, Original)
+        self.assertIsInstance(missing, Original)
+        schedule.assert_called_once()
+
+    def test_cached_lookups_need_no_query(self):
+        """Повторная выборка берет миниатюры из кеша"""
+        posts = list(Post.objects.all())
+        prefetch(posts)
+        with self.assertNumQueries(0):
+            prefetch(posts)
+
+    def test_pages_prefetch(self):
+        """Лента не ищет миниатюры по одной"""
+        with mock.patch.object(
+            default.kvstore, 'get', side_effect=AssertionError
+        ), mock.patch('posts.thumbnails.schedule'):
+            response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, 'cache/', count=2)
@@ -0,0 +1,184 @@
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..models import Follow, Post, PulledAuthor, TimelineEntry, User
+
+
+class TimelineTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.follower = User.objects.create_user(username='follower')
+        cls.stranger = User.objects.create_user(username='stranger')
+        cls.old_post = Post.objects.create(
+            text='Пост до подписки',
+            author=cls.author,
+        )
+        cls.follower_client = Client()
+        cls.follower_client.force_login(cls.follower)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_follow_backfills_timeline(self):
+        """Подписка добавляет в ленту уже опубликованные посты автора"""
+        self.follower_client.get(
+            reverse('posts:profile_follow', kwargs={'username': 'author'})
+        )
+        self.assertTrue(
+            TimelineEntry.objects.filter(
+                user=self.follower,
+                post=self.old_post,
+            ).exists()
+        )
+
+    def test_new_post_is_pushed_to_followers(self):
+        """Новый пост попадает только в ленты подписчиков автора"""
+        Follow.objects.create(user=self.follower, author=self.author)
+        new_post = Post.objects.create(text='Новый пост', author=self.author)
+        self.assertTrue(
+            self.follower.timeline.filter(post=new_post).exists()
+        )
+        self.assertFalse(
+            self.stranger.timeline.filter(post=new_post).exists()
+        )
+
+    def test_unfollow_prunes_timeline(self):
+        """Отписка убирает посты автора из ленты"""
+        Follow.objects.create(user=self.follower, author=self.author)
+        self.follower_client.get(
+            reverse('posts:profile_unfollow', kwargs={'username': 'author'})
+        )
+        self.assertFalse(self.follower.timeline.exists())
+
+    def test_follow_index_reads_timeline(self):
+        """Страница подписок показывает посты из ленты пользователя"""
+        Follow.objects.create(user=self.follower, author=self.author)
+        new_post = Post.objects.create(text='Новый пост', author=self.author)
+        response = self.follower_client.get(reverse('posts:follow_index'))
+        self.assertEqual(
+            list(response.context['page_obj']),
+            [new_post, self.old_post]
+        )
+
+    def test_rebuild_timelines_command(self):
+        """Команда rebuild_timelines восстанавливает ленты с нуля"""
+        Follow.objects.create(user=self.follower, author=self.author)
+        Post.objects.create(text='Новый пост', author=self.author)
+        expected = list(
+            self.follower.timeline.values_list('post_id', flat=True)
+        )
+        TimelineEntry.objects.all().delete()
+        call_command('rebuild_timelines', stdout=StringIO())
+        self.assertEqual(
+            list(self.follower.timeline.values_list('post_id', flat=True)),
+            expected
+        )
+        self.assertEqual(TimelineEntry.objects.count(), len(expected))
+
+
+@override_settings(FEED_PULL_THRESHOLD=2)
+class HybridFeedTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.star = User.objects.create_user(username='star')
+        cls.author = User.objects.create_user(username='author')
+        cls.follower = User.objects.create_user(username='follower')
+        cls.fan = User.objects.create_user(username='fan')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.follower_client = Client()
+        cls.follower_client.force_login(cls.follower)
+
+    def setUp(self):
+        Follow.objects.create(user=self.follower, author=self.star)
+        Follow.objects.create(user=self.fan, author=self.star)
+        Follow.objects.create(user=self.reader, author=self.star)
+        Follow.objects.create(user=self.follower, author=self.author)
+
+    def test_author_over_threshold_is_pulled(self):
+        """Посты автора с множеством подписчиков не раскладываются по лентам"""
+        self.assertTrue(
+            PulledAuthor.objects.filter(author=self.star).exists()
+        )
+        Post.objects.create(text='Пост звезды', author=self.star)
+        self.assertFalse(
+            TimelineEntry.objects.filter(author=self.star).exists()
+        )
+
+    def test_author_under_threshold_is_pushed_again(self):
+        """После отписок rebuild_timelines снова раскладывает посты автора"""
+        post = Post.objects.create(text='Пост звезды', author=self.star)
+        Follow.objects.filter(author=self.star).delete()
+        self.assertTrue(
+            PulledAuthor.objects.filter(author=self.star).exists()
+        )
+        call_command('rebuild_timelines', stdout=StringIO())
+        self.assertFalse(
+            PulledAuthor.objects.filter(author=self.star).exists()
+        )
+        Follow.objects.create(user=self.fan, author=self.star)
+        self.assertTrue(self.fan.timeline.filter(post=post).exists())
+
+    def test_follow_reads_followers_counter(self):
+        """Подписка и отписка не пересчитывают подписчиков автора"""
+        for action in ('profile_follow', 'profile_unfollow'):
+            with self.subTest(action=action):
+                url = reverse(
+                    f'posts:{action}', kwargs={'username': 'author'}
+                )
+                self.client.force_login(self.fan)
+                with CaptureQueriesContext(connection) as queries:
+                    self.client.get(url)
+                for query in queries.captured_queries:
+                    self.assertNotIn('COUNT(', query['sql'].upper())
+
+    def test_feed_merges_pushed_and_pulled_posts(self):
+        """Лента подписок объединяет оба источника по дате публикации"""
+        posts = [
+            Post.objects.create(text=f'Пост №{i}', author=author)
+            for i in range(12)
+            for author in (self.star, self.author)
+        ]
+        posts.reverse()
+        response = self.follower_client.get(reverse('posts:follow_index'))
+        first_page = response.context['page_obj']
+        response = self.follower_client.get(
+            reverse('posts:follow_index'),
+            {'cursor': first_page.next_cursor}
+        )
+        feed = list(first_page) + list(response.context['page_obj'])
+        self.assertEqual(feed, posts[:20])
+
+    def test_feed_with_many_pulled_authors(self):
+        """
+        Посты сотен популярных авторов читаются в ленту частями: одно
+        условие на всех превысило бы предел глубины выражений SQLite
+        """
+        User.objects.bulk_create(
+            User(username=f'star_{i:04}') for i in range(1100)
+        )
+        stars = list(
+            User.objects.filter(username__startswith='star_')
+            .order_by('username')
+        )
+        PulledAuthor.objects.bulk_create(
+            PulledAuthor(author=star) for star in stars
+        )
+        Follow.objects.bulk_create(
+            Follow(user=self.follower, author=star) for star in stars
+        )
+        posts = [
+            Post.objects.create(text=f'Пост №{i}', author=star)
+            for i, star in enumerate(stars[::100])
+        ]
+        posts.reverse()
+        response = self.follower_client.get(reverse('posts:follow_index'))
+        self.assertEqual(list(response.context['page_obj']), posts[:10])
@@ -0,0 +1,192 @@
+import json
+import os
+import shutil
+import struct
+import subprocess
+import sys
+import tempfile
+import unittest
+import zlib
+from io import BytesIO
+from unittest import mock
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+from PIL import Image, ImageFile
+
+from core.storage import content_name
+
+from .. import views
+from ..models import Post, User
+from ..thumbnails import MAX_IMAGE_SIDE
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+# Байт на пиксель картинки, декодированной Pillow (RGB хранится как RGBX)
+PIXEL_BYTES: int = 4
+# Рост пика на запрос, не считая пикселей картинки
+PEAK_SLACK: int = 4 * 1024 * 1024
+
+
+def noise_png(side):
+    """PNG без сжатия: размер файла примерно side * side * 3 байт."""
+    content = BytesIO()
+    Image.frombytes(
+        'RGB', (side, side), os.urandom(side * side * 3)
+    ).save(content, 'PNG', compress_level=0)
+    return content.getvalue()
+
+
+def png_header(width, height):
+    """PNG с заголовком картинки width x height, но почти без пикселей."""
+    def chunk(kind, data):
+        return (
+            struct.pack('>I', len(data)) + kind + data
+            + struct.pack('>I', zlib.crc32(kind + data))
+        )
+    return b'\x89PNG\r\n\x1a\n' + chunk(
+        b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)
+    ) + chunk(b'IDAT', zlib.compress(b'\0' * 1024)) + chunk(b'IEND', b'')
+
+
+def jpeg(width, height):
+    content = BytesIO()
+    Image.new('RGB', (width, height), (255, 0, 0)).save(content, 'JPEG')
+    return content.getvalue()
+
+
+def upload_peak(name, content, content_type='image/png', max_size=None):
+    """
+    Статус ответа post_create, коды ошибок поля image и рост пика
+    памяти процесса при обработке запроса (см. upload_peak).
+    """
+    with tempfile.NamedTemporaryFile() as image:
+        image.write(content)
+        image.flush()
+        command = [
+            sys.executable, '-m', 'posts.tests.upload_peak',
+            image.name, name, content_type,
+        ]
+        if max_size:
+            command += ['--max-size', str(max_size)]
+        result = subprocess.run(
+            command, cwd=settings.BASE_DIR, capture_output=True,
+            text=True, check=True,
+        )
+    return json.loads(result.stdout)
+
+
+@unittest.skipUnless(
+    os.path.exists('/proc/self/clear_refs'), 'пик памяти меряется в Linux'
+)
+class UploadPeakTests(unittest.TestCase):
+    """
+    Память Pillow не видна tracemalloc, поэтому пик меряется в отдельном
+    процессе: это пик всей памяти процесса.
+    """
+
+    def test_peak_memory_grows_with_pixels_not_copies(self):
+        """Картинка декодируется при загрузке не больше одного раза."""
+        for side in (600, 1700):
+            with self.subTest(side=side):
+                peak = upload_peak(f'{side}.png', noise_png(side))
+                self.assertEqual(peak['status'], 302)
+                self.assertLess(
+                    peak['growth'],
+                    side * side * PIXEL_BYTES * 5 // 4 + PEAK_SLACK,
+                )
+
+    def test_too_large_upload_peak_does_not_grow(self):
+        """Слишком большой файл отклоняется, не попадая в память."""
+        peak = upload_peak(
+            'large.png', noise_png(1700), max_size=1024 * 1024
+        )
+        self.assertEqual(peak['errors'], ['too_large'])
+        self.assertLess(peak['growth'], PEAK_SLACK)
+
+    def test_downscale_peak_memory(self):
+        """
+        JPEG уменьшается из черновика вдвое меньшего размера, и пик
+        не больше трёх таких черновиков.
+        """
+        peak = upload_peak('photo.jpg', jpeg(6000, 4500), 'image/jpeg')
+        self.assertEqual(peak['status'], 302)
+        self.assertLess(
+            peak['growth'], 3 * 3000 * 2250 * PIXEL_BYTES + PEAK_SLACK
+        )
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class UploadsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def post_create(self, name, content, content_type='image/png'):
+        """Форма из post_create и его ответ."""
+        request = RequestFactory().post(reverse('posts:post_create'), {
+            'text': 'Текст',
+            'image': SimpleUploadedFile(name, content, content_type),
+        })
+        request.user = self.author
+        self.addCleanup(request.close)
+        with mock.patch(
+            'posts.views.render', wraps=views.render
+        ) as render:
+            response = views.post_create(request)
+        form = render.call_args[0][2]['form'] if render.called else None
+        return form, response
+
+    def test_upload_stored_as_is(self):
+        """Картинка не больше MAX_IMAGE_SIDE сохраняется как есть."""
+        for side in (600, 1700):
+            content = noise_png(side)
+            with self.subTest(size=len(content)):
+                form, response = self.post_create(f'{side}.png', content)
+                self.assertEqual(response.status_code, 302)
+                post = Post.objects.get(image=content_name(
+                    f'posts/{side}.png', ContentFile(content)
+                ))
+                self.assertEqual(post.image.size, len(content))
+
+    @override_settings(UPLOAD_MAX_SIZE=1024 * 1024)
+    def test_too_large_upload_rejected(self):
+        """Файл больше UPLOAD_MAX_SIZE отклоняется."""
+        content = noise_png(1700)
+        form, response = self.post_create('large.png', content)
+        self.assertTrue(form.has_error('image', 'too_large'))
+        self.assertFalse(Post.objects.exists())
+
+    def test_too_many_pixels_rejected_from_header(self):
+        """Картинка со слишком большим заголовком не декодируется."""
+        with mock.patch.object(
+            ImageFile.ImageFile, 'load', autospec=True,
+            side_effect=ImageFile.ImageFile.load,
+        ) as load:
+            form, response = self.post_create(
+                'bomb.png', png_header(8000, 8000)
+            )
+        self.assertTrue(form.has_error('image', 'too_many_pixels'))
+        load.assert_not_called()
+        self.assertFalse(Post.objects.exists())
+
+    def test_oversize_image_downscaled(self):
+        """Слишком большая картинка уменьшается перед сохранением."""
+        form, response = self.post_create(
+            'photo.jpg', jpeg(4000, 3000), 'image/jpeg'
+        )
+        self.assertEqual(response.status_code, 302)
+        post = Post.objects.get()
+        size = (MAX_IMAGE_SIDE, MAX_IMAGE_SIDE * 3 // 4)
+        self.assertEqual((post.image_width, post.image_height), size)
+        with Image.open(post.image.path) as image:
+            self.assertEqual(image.format, 'JPEG')
+            self.assertEqual(image.size, size)
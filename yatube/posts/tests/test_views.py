@@ -1,3 +1,4 @@
+import re
 import shutil
 import tempfile
 
@@ -5,11 +6,14 @@ from django import forms
 from django.conf import settings
 from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
 from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from http import HTTPStatus
 
 from ..models import Group, Post, User, Follow
+from ..paginators import encode_cursor
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 NUMBER_OF_POSTS = 14
@@ -183,7 +187,7 @@ class PostPagesTests(TestCase):
             with self.subTest(url=url):
                 response = self.authorized_client.get(url)
                 first_object = response.context['page_obj'][0]
-                self.assertEqual(first_object.image, f'posts/{uploaded.name}')
+                self.assertEqual(first_object.image, post_whith_image.image)
         response = self.authorized_client.get(
             reverse(
                 'posts:post_detail',
@@ -193,7 +197,7 @@ class PostPagesTests(TestCase):
         post_detail_context_with_image = response.context['post']
         self.assertEqual(
             post_detail_context_with_image.image,
-            f'posts/{uploaded.name}'
+            post_whith_image.image
         )
 
     def test_comments_for_authorized_users(self):
@@ -254,6 +258,26 @@ class PostPagesTests(TestCase):
             response_for_existent_comment.content
         )
 
+    def test_delete_only_by_authors_post_request(self):
+        """GET и чужие запросы не удаляют пост, форму видит только автор"""
+        url = reverse('posts:post_delete', kwargs={'post_id': self.post.id})
+        detail_url = reverse(
+            'posts:post_detail', kwargs={'post_id': self.post.id}
+        )
+        response = self.authorized_client.get(url)
+        self.assertEqual(response.status_code, HTTPStatus.METHOD_NOT_ALLOWED)
+        self.assertRedirects(
+            self.client.post(url), f'{reverse("users:login")}?next={url}'
+        )
+        self.auth_client_follow.post(url)
+        self.assertTrue(Post.objects.filter(id=self.post.id).exists())
+        self.assertContains(
+            self.authorized_client.get(detail_url), f'action="{url}"'
+        )
+        self.assertNotContains(
+            self.auth_client_follow.get(detail_url), f'action="{url}"'
+        )
+
     def test_authorized_can_follow(self):
         """Проверяем возможность подписки авторизованного пользователя"""
         followers_count = Follow.objects.count()
@@ -368,6 +392,9 @@ class PaginatorViewsTest(TestCase):
             ),
         ]
 
+    def setUp(self):
+        cache.clear()
+
     def test_first_page_contains_ten_records(self):
         cache.clear()
         """Проверка паджинации на первой странице"""
@@ -383,8 +410,106 @@ class PaginatorViewsTest(TestCase):
         """Проверка паджинации на второй странице"""
         for page_name in self.pages_names:
             with self.subTest(page_name=page_name):
-                response = self.client.get((page_name) + '?page=2')
+                first_page = self.client.get(page_name).context['page_obj']
+                response = self.client.get(
+                    page_name, {'cursor': first_page.next_cursor}
+                )
                 self.assertEqual(
                     len(response.context.get('page_obj')),
                     EXPECTED_AMOUNT_OF_POSTS_SECOND_PAGE
                 )
+                self.assertEqual(response.context['page_obj'].number, 2)
+                self.assertFalse(response.context['page_obj'].has_next())
+
+    def test_pages_do_not_overlap(self):
+        """Посты на соседних страницах не повторяются и идут по порядку"""
+        cache.clear()
+        first_page = self.client.get(self.pages_names[0]).context['page_obj']
+        second_page = self.client.get(
+            self.pages_names[0], {'cursor': first_page.next_cursor}
+        ).context['page_obj']
+        posts = list(first_page) + list(second_page)
+        self.assertEqual(
+            posts,
+            list(Post.objects.order_by('-pub_date', '-id'))
+        )
+
+    def test_previous_cursor_returns_first_page(self):
+        """Курсор 'Previous' со второй страницы ведет на первую"""
+        cache.clear()
+        first_page = self.client.get(self.pages_names[1]).context['page_obj']
+        second_page = self.client.get(
+            self.pages_names[1], {'cursor': first_page.next_cursor}
+        ).context['page_obj']
+        response = self.client.get(
+            self.pages_names[1], {'cursor': second_page.previous_cursor}
+        )
+        page_obj = response.context['page_obj']
+        self.assertEqual(page_obj.number, 1)
+        self.assertFalse(page_obj.has_previous())
+        self.assertEqual(list(page_obj), list(first_page))
+
+    def test_broken_cursor_shows_first_page(self):
+        """Испорченный курсор показывает первую страницу"""
+        for page_name in self.pages_names:
+            with self.subTest(page_name=page_name):
+                response = self.client.get(page_name, {'cursor': '%%%'})
+                self.assertEqual(response.status_code, HTTPStatus.OK)
+                self.assertEqual(response.context['page_obj'].number, 1)
+
+    def test_out_of_range_cursor_shows_first_page(self):
+        """Курсор со слишком большим или логическим pk ведет на первую"""
+        newest = Post.objects.order_by('-pub_date', '-id').first()
+        cursors = [
+            encode_cursor(newest.pub_date, 10 ** 20, 2),
+            encode_cursor(newest.pub_date, True, 2),
+            encode_cursor(newest.pub_date, newest.id, 10 ** 20),
+        ]
+        for page_name in self.pages_names:
+            for cursor in cursors:
+                with self.subTest(page_name=page_name, cursor=cursor):
+                    response = self.client.get(page_name, {'cursor': cursor})
+                    self.assertEqual(response.status_code, HTTPStatus.OK)
+                    self.assertEqual(response.context['page_obj'].number, 1)
+
+    def test_paginator_shows_window_around_page(self):
+        """Пагинатор показывает первую, соседние и текущую страницы"""
+        newest = Post.objects.order_by('-pub_date', '-id').first()
+        cursor = encode_cursor(newest.pub_date, newest.id, 5)
+        for page_name in self.pages_names:
+            with self.subTest(page_name=page_name):
+                content = self.client.get(
+                    page_name, {'cursor': cursor}
+                ).content.decode()
+                labels = re.findall(
+                    r'class="page-link"[^>]*>\s*([^<]+?)\s*<', content
+                )
+                self.assertEqual(
+                    labels,
+                    ['Previous', '1', '&hellip;', '4', '5', '6', 'Next'],
+                )
+
+    def test_paginator_refuses_counting(self):
+        """Операции, требующие подсчета постов, явно не поддерживаются"""
+        page_obj = self.client.get(self.pages_names[0]).context['page_obj']
+        for operation in (
+            lambda: page_obj.paginator.count,
+            lambda: page_obj.paginator.page(2),
+            page_obj.start_index,
+        ):
+            with self.subTest(operation=operation):
+                with self.assertRaisesMessage(TypeError, 'CursorPaginator'):
+                    operation()
+
+    def test_paginator_does_not_count_posts(self):
+        """Пагинация не выполняет COUNT(*) и OFFSET"""
+        cache.clear()
+        first_page = self.client.get(self.pages_names[1]).context['page_obj']
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(
+                self.pages_names[1], {'cursor': first_page.next_cursor}
+            )
+        for query in queries.captured_queries:
+            with self.subTest(sql=query['sql']):
+                self.assertNotIn('COUNT(', query['sql'].upper())
+                self.assertNotIn('OFFSET', query['sql'].upper())
@@ -0,0 +1,151 @@
+"""
+Peak memory of post_create handling one upload, for test_uploads.
+
+Pillow decodes pixels into buffers of its own, which tracemalloc never
+sees, so the request runs in a process of its own and the growth of
+its peak resident set (VmHWM, Linux only) is measured instead, from
+the moment the setup is done:
+
+    python -m posts.tests.upload_peak IMAGE NAME CONTENT_TYPE
+
+The request body is streamed from a file, as a server reads it, so
+that nothing but the request handling raises the peak. A JSON object
+with the response status, the form's error codes and the growth of
+the peak in bytes is printed.
+"""
+import argparse
+import ctypes
+import gc
+import json
+import os
+import shutil
+import tempfile
+
+BOUNDARY: str = 'UploadPeakBoundary'
+
+
+def peak_rss():
+    """
+    Peak resident set of the process since reset_peak(), in bytes.
+
+    ru_maxrss would do, but for the peak of the parent process, which
+    it keeps across exec and which clear_refs does not reset.
+    """
+    with open('/proc/self/status') as status:
+        for line in status:
+            if line.startswith('VmHWM:'):
+                return int(line.split()[1]) * 1024
+    raise RuntimeError('VmHWM is missing from /proc/self/status')
+
+
+def reset_peak():
+    """Count the peak resident set from its current size on."""
+    gc.collect()
+    # Heap freed by the setup would otherwise be reused unseen
+    ctypes.CDLL(None).malloc_trim(0)
+    with open('/proc/self/clear_refs', 'w') as clear_refs:
+        clear_refs.write('5')
+
+
+def write_body(body, path, name, content_type):
+    """Write a post_create multipart body, the image copied in chunks."""
+    body.write(
+        f'--{BOUNDARY}\r\n'
+        'Content-Disposition: form-data; name="text"\r\n\r\n'
+        'Text\r\n'
+        f'--{BOUNDARY}\r\n'
+        'Content-Disposition: form-data; name="image"; '
+        f'filename="{name}"\r\n'
+        f'Content-Type: {content_type}\r\n\r\n'.encode()
+    )
+    with open(path, 'rb') as image:
+        shutil.copyfileobj(image, body)
+    body.write(f'\r\n--{BOUNDARY}--\r\n'.encode())
+    body.seek(0)
+
+
+def post_create(author, path, name, content_type):
+    """Status of post_create for the upload and the form's error codes."""
+    from unittest import mock
+
+    from django.core.handlers.wsgi import WSGIRequest
+    from django.db import transaction
+    from django.urls import reverse
+
+    from posts import views
+
+    with tempfile.TemporaryFile() as body:
+        write_body(body, path, name, content_type)
+        request = WSGIRequest({
+            'REQUEST_METHOD': 'POST',
+            'PATH_INFO': reverse('posts:post_create'),
+            'SERVER_NAME': 'testserver',
+            'SERVER_PORT': '80',
+            'wsgi.url_scheme': 'http',
+            'CONTENT_TYPE': f'multipart/form-data; boundary={BOUNDARY}',
+            'CONTENT_LENGTH': str(os.fstat(body.fileno()).st_size),
+            'wsgi.input': body,
+        })
+        request.user = author
+        with mock.patch(
+            'posts.views.render', wraps=views.render
+        ) as render, transaction.atomic():
+            response = views.post_create(request)
+            # Nothing is kept and the thumbnails are never queued
+            transaction.set_rollback(True)
+        request.close()
+    errors = []
+    if render.called:
+        form = render.call_args[0][2]['form']
+        errors = [error.code for error in form.errors.as_data()['image']]
+    return response.status_code, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('path')
+    parser.add_argument('name')
+    parser.add_argument('content_type')
+    parser.add_argument('--max-size', type=int)
+    args = parser.parse_args()
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
+    import django
+    django.setup()
+    from django.conf import settings
+    from django.db import connection
+    from django.test.utils import setup_test_environment
+
+    from posts.models import User
+    from yatube.test_runner import temporary_cache
+
+    setup_test_environment()
+    connection.creation.create_test_db(verbosity=0)
+    media_root = tempfile.mkdtemp()
+    settings.MEDIA_ROOT = media_root
+    if args.max_size:
+        settings.UPLOAD_MAX_SIZE = args.max_size
+    try:
+        with temporary_cache():
+            author = User.objects.create_user(username='author')
+            # The first request loads the templates and the modules
+            warmup = os.path.join(media_root, 'warmup.gif')
+            with open(warmup, 'wb') as file_:
+                file_.write(
+                    b'GIF89a\x01\x00\x01\x00\x80\x00\x00\x00\x00\x00\xff\xff'
+                    b'\xff!\xf9\x04\x00\x00\x00\x00\x00,\x00\x00\x00\x00\x01'
+                    b'\x00\x01\x00\x00\x02\x02D\x01\x00;'
+                )
+            post_create(author, warmup, 'warmup.gif', 'image/gif')
+            reset_peak()
+            before = peak_rss()
+            status, errors = post_create(
+                author, args.path, args.name, args.content_type
+            )
+            growth = peak_rss() - before
+    finally:
+        shutil.rmtree(media_root, ignore_errors=True)
+    print(json.dumps({'status': status, 'errors': errors, 'growth': growth}))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,34 @@
+from concurrent.futures import Future
+
+from django.test import override_settings
+from django.urls import resolve
+
+
+class QueryBudgetTestMixin:
+    """Запросы к вьюхам, падающие сразу при выходе за бюджет запросов."""
+
+    def assertWithinQueryBudget(self, client, url, method='get', **kwargs):
+        view = resolve(url.split('?')[0]).func
+        self.assertIsNotNone(
+            getattr(view, 'query_budget', None),
+            f'The view behind {url} does not declare a query budget',
+        )
+        with override_settings(QUERY_BUDGET_STRICT=True):
+            return getattr(client, method)(url, **kwargs)
+
+
+def done(result=None):
+    future = Future()
+    future.set_result(result)
+    return future
+
+
+class InlinePool:
+    """Пул, выполняющий задачу сразу, в потоке запроса."""
+
+    def __init__(self):
+        self.submitted = []
+
+    def submit(self, fn, *args):
+        self.submitted.append(args)
+        return done(fn(*args))
@@ -0,0 +1,433 @@
+"""
+Thumbnails of post images, made on a worker pool instead of a request.
+
+Each crop the templates show comes in several widths and formats, its
+variants, for browsers to pick from a srcset. Every variant is listed
+in GEOMETRIES and made as soon as a post is saved with a new image.
+ThumbnailBackend, set as THUMBNAIL_BACKEND, only looks thumbnails up:
+one that is not made yet is queued, and the template gets the original
+image in its box. A page of posts can have all its thumbnails looked
+up at once with prefetch.
+
+The size of an image and a placeholder preview are measured once, as
+its post is saved, and kept on the post.
+"""
+import base64
+import hashlib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.core.cache import cache
+from django.db import close_old_connections, transaction
+from PIL import Image, ImageOps
+from sorl.thumbnail import default
+from sorl.thumbnail.base import ThumbnailBackend as SorlThumbnailBackend
+from sorl.thumbnail.conf import defaults as default_settings
+from sorl.thumbnail.conf import settings
+from sorl.thumbnail.images import (DummyImageFile, ImageFile,
+                                   deserialize_image_file)
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.kvstores.cached_db_kvstore import EMPTY_VALUE, KVStore
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+from . import caching
+from .models import Post, StoredImage
+
+logger = logging.getLogger(__name__)
+
+CARD_CROP: str = 'left'
+DETAIL_CROP: str = 'center'
+# Widths of the variants, each one cropped to its box
+WIDTHS = (350, 700, 1400)
+DEFAULT_WIDTH: int = 700
+# Formats of the variants and their types, the preferred one first;
+# the last one is the fallback of browsers that support no other
+FORMATS = {'WEBP': 'image/webp', 'JPEG': 'image/jpeg'}
+# Uploads with more pixels are refused, read from their header alone,
+# and larger ones are scaled down to MAX_IMAGE_SIDE before being stored
+MAX_IMAGE_PIXELS: int = 40_000_000
+MAX_IMAGE_SIDE: int = 2 * WIDTHS[-1]
+DOWNSCALE_QUALITY: int = 90
+# Width of the placeholder previews, and their JPEG quality
+PLACEHOLDER_WIDTH: int = 16
+PLACEHOLDER_QUALITY: int = 40
+# Post fields filled by measure
+MEASURED_FIELDS = ('image_width', 'image_height', 'image_placeholder')
+WORKERS: int = 2
+QUEUED_KEY_PREFIX: str = 'posts:thumbnail'
+# A queued thumbnail is not queued again for this long, in seconds
+QUEUED_TIMEOUT: int = 60
+# EXIF orientations that swap the width and the height
+ORIENTATION: int = 0x0112
+ROTATED = (5, 6, 7, 8)
+
+
+def height(width):
+    """Height of the 7:5 box of a width."""
+    return width * 5 // 7
+
+
+def box(width):
+    return f'{width}x{height(width)}'
+
+
+def variant(crop, width, format_):
+    """
+    (geometry, options) of one variant of a crop.
+
+    Variants are never upscaled: pages scale a small image up for free,
+    instead of downloading the bytes of an upscaled one.
+    """
+    return box(width), {'crop': crop, 'upscale': False, 'format': format_}
+
+
+def widths(source_width=None):
+    """Widths of the variants of an image, none wider than it."""
+    if source_width is None:
+        return WIDTHS
+    return [
+        width for width in WIDTHS if width <= source_width
+    ] or WIDTHS[:1]
+
+
+def variants(crop, source_width=None):
+    return [
+        variant(crop, width, format_)
+        for format_ in FORMATS for width in widths(source_width)
+    ]
+
+
+def geometries(source_width=None):
+    """Every variant the templates show of an image."""
+    return tuple(
+        variants(CARD_CROP, source_width)
+        + variants(DETAIL_CROP, source_width)
+    )
+
+
+GEOMETRIES = geometries()
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _executor():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(
+                max_workers=WORKERS, thread_name_prefix='thumbnails'
+            )
+        return _pool
+
+
+def source(name):
+    """
+    A post image by name, in the storage of post images.
+
+    Thumbnails are named after their source and its storage, so the
+    pool has to open a source the way the templates see it.
+    """
+    return ImageFile(name, Post._meta.get_field('image').storage)
+
+
+def generate(name, geometries=GEOMETRIES):
+    """
+    Make the thumbnails of one image, skipping the ones that exist.
+
+    Pages cached meanwhile show the original in place of a missing
+    thumbnail, so once one is made the pages of the posts using the
+    image are invalidated. Return how many of them failed.
+    """
+    backend = SorlThumbnailBackend()
+    failed = made = 0
+    # The key-value store is in the database, used here off a request
+    close_old_connections()
+    try:
+        for geometry, options in geometries:
+            image = source(name)
+            try:
+                missing = not ThumbnailBackend().lookup(
+                    image, geometry, options
+                )
+                backend.get_thumbnail(image, geometry, **options)
+                made += missing
+            except Exception:
+                logger.exception('Thumbnail %s of %s failed', geometry, name)
+                failed += 1
+            finally:
+                cache.delete(_queued_key(name, geometry, options))
+        if made:
+            caching.bump(*image_scopes(name))
+    finally:
+        close_old_connections()
+    return failed
+
+
+def image_scopes(name):
+    """Cache scopes of the pages showing the posts that use an image."""
+    scopes = {caching.FEED}
+    posts = Post.objects.filter(image=name).values_list(
+        'id', 'author__username', 'group__slug'
+    )
+    for post_id, username, slug in posts:
+        scopes.add(caching.post_scope(post_id))
+        scopes.add(caching.author_scope(username))
+        if slug:
+            scopes.add(caching.group_scope(slug))
+    return scopes
+
+
+def delete_unused(name):
+    """
+    Delete an image file once no post uses it, with its thumbnails.
+
+    Identical images share one file and its thumbnails, see
+    core.storage; StoredImage counts the posts using each of them.
+    The deleted row stays locked until the file is gone, so a post
+    counting the image meanwhile waits and then finds it missing.
+    """
+    with transaction.atomic():
+        unused = StoredImage.objects.filter(name=name, posts_count__lte=0)
+        if unused.delete()[0]:
+            try:
+                SorlThumbnailBackend().delete(source(name))
+            except Exception:
+                logger.exception('Deleting %s failed', name)
+
+
+def too_many_pixels(file_):
+    """Whether an image is over MAX_IMAGE_PIXELS, from its header alone."""
+    file_.seek(0)
+    try:
+        # Image.open only parses the header, pixels are decoded on load
+        with Image.open(file_) as image:
+            width, height = image.size
+    except Image.DecompressionBombError:
+        return True
+    except Exception:
+        # Not an image at all, ImageField reports it
+        return False
+    finally:
+        file_.seek(0)
+    return width * height > MAX_IMAGE_PIXELS
+
+
+def downscale(upload):
+    """
+    Scale an upload down to MAX_IMAGE_SIDE, in place, and return it.
+
+    JPEGs are decoded straight at a fraction of their size; once the
+    pixels are loaded the smaller image overwrites the upload's file.
+    """
+    upload.seek(0)
+    with Image.open(upload) as image:
+        if (
+            max(image.size) <= MAX_IMAGE_SIDE
+            or getattr(image, 'is_animated', False)
+        ):
+            upload.seek(0)
+            return upload
+        options = {'quality': DOWNSCALE_QUALITY}
+        if 'exif' in image.info:
+            options['exif'] = image.info['exif']
+        ratio = MAX_IMAGE_SIDE / max(image.size)
+        # thumbnail's own draft asks for twice the size, too much here
+        image.draft(image.mode, (
+            round(image.width * ratio), round(image.height * ratio)
+        ))
+        image.thumbnail((MAX_IMAGE_SIDE, MAX_IMAGE_SIDE), Image.LANCZOS)
+        upload.seek(0)
+        upload.truncate()
+        image.save(upload, image.format, **options)
+    upload.size = upload.tell()
+    upload.seek(0)
+    return upload
+
+
+def measure(file_):
+    """
+    (width, height, placeholder) of an image, as pages show it.
+
+    The placeholder is the data URI of a tiny JPEG, which browsers
+    stretch over the box of the image until the image itself loads.
+    """
+    file_.seek(0)
+    with Image.open(file_) as image:
+        width, height = image.size
+        if image.getexif().get(ORIENTATION) in ROTATED:
+            width, height = height, width
+        # JPEGs are decoded at a fraction of their size, enough here
+        image.draft('RGB', (PLACEHOLDER_WIDTH, PLACEHOLDER_WIDTH))
+        # Shrunk in place first: only the tiny image is then copied
+        image.thumbnail((PLACEHOLDER_WIDTH, PLACEHOLDER_WIDTH))
+        preview = ImageOps.exif_transpose(image).convert('RGB')
+    file_.seek(0)
+    content = BytesIO()
+    preview.save(content, 'JPEG', quality=PLACEHOLDER_QUALITY)
+    encoded = base64.b64encode(content.getvalue()).decode()
+    return width, height, f'data:image/jpeg;base64,{encoded}'
+
+
+def measure_post(post):
+    """Fill the MEASURED_FIELDS of a post from its image."""
+    values = (None, None, '')
+    image = post.image
+    if image:
+        try:
+            if image._committed:
+                # A stored image is opened here, and closed after
+                with image.open('rb'):
+                    values = measure(image)
+            else:
+                values = measure(image)
+        except Exception:
+            logger.exception('Measuring %s failed', image.name)
+    for field, value in zip(MEASURED_FIELDS, values):
+        setattr(post, field, value)
+
+
+def _queued_key(name, geometry, options):
+    digest = hashlib.md5(
+        f'{name}:{geometry}:{sorted(options.items())}'.encode()
+    ).hexdigest()
+    return f'{QUEUED_KEY_PREFIX}:{digest}'
+
+
+def schedule(name, geometries=GEOMETRIES):
+    """
+    Queue the thumbnails of an image for the worker pool.
+
+    They are queued once the current transaction commits, so workers
+    never wait on the locks of the transaction saving the post.
+    """
+    geometries = [
+        (geometry, options) for geometry, options in geometries
+        if cache.add(
+            _queued_key(name, geometry, options), True, QUEUED_TIMEOUT
+        )
+    ]
+    if geometries:
+        transaction.on_commit(lambda: _submit(name, geometries))
+
+
+def _submit(name, geometries):
+    _executor().submit(generate, name, geometries)
+
+
+class Original(DummyImageFile):
+    """
+    The source image standing in for a thumbnail not made yet.
+
+    It has the size of the thumbnail box, and being a dummy it makes
+    sorl's margin filter answer 'auto' instead of opening the source.
+    """
+
+    def __init__(self, source, geometry_string):
+        super().__init__(geometry_string)
+        self.source = source
+
+    @property
+    def url(self):
+        return self.source.url
+
+
+class ThumbnailBackend(SorlThumbnailBackend):
+    """sorl backend that never opens or resizes an image itself."""
+
+    def thumbnail_name(self, source, geometry_string, options):
+        """Name of the thumbnail, options completed the way sorl does."""
+        options = dict(options)
+        if settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault('format', self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(settings, attr)
+            if value != getattr(default_settings, attr):
+                options.setdefault(key, value)
+        return self._get_thumbnail_filename(source, geometry_string, options)
+
+    def lookup(self, file_, geometry_string, options):
+        """The thumbnail if it is made, None otherwise."""
+        name = self.thumbnail_name(
+            ImageFile(file_), geometry_string, options
+        )
+        prefetched = getattr(
+            getattr(file_, 'instance', None), '_thumbnails', {}
+        )
+        if name in prefetched:
+            return prefetched[name]
+        return default.kvstore.get(ImageFile(name, default.storage))
+
+    def get_thumbnail(self, file_, geometry_string, **options):
+        cached = self.lookup(file_, geometry_string, options)
+        if cached:
+            return cached
+        source = ImageFile(file_)
+        schedule(source.name, [(geometry_string, options)])
+        return Original(source, geometry_string)
+
+
+def _get_many_raw(keys):
+    """Raw key-value store values of keys, None for the missing ones."""
+    kvstore = default.kvstore
+    if not isinstance(kvstore, KVStore):
+        return {key: kvstore._get_raw(key) for key in keys}
+    found = kvstore.cache.get_many(keys)
+    missing = [key for key in keys if key not in found]
+    if missing:
+        stored = dict(
+            KVStoreModel.objects.filter(key__in=missing).values_list(
+                'key', 'value'
+            )
+        )
+        fetched = {key: stored.get(key, EMPTY_VALUE) for key in missing}
+        # Misses are cached too, as sorl does, until the thumbnail is made
+        kvstore.cache.set_many(fetched, settings.THUMBNAIL_CACHE_TIMEOUT)
+        found.update(fetched)
+    return {
+        key: None if found[key] == EMPTY_VALUE else found[key]
+        for key in keys
+    }
+
+
+def ready(post):
+    """Whether every prefetched thumbnail of the post is made."""
+    thumbnails = getattr(post, '_thumbnails', None)
+    return bool(thumbnails) and all(thumbnails.values())
+
+
+def prefetch(posts, crops=(CARD_CROP, DETAIL_CROP)):
+    """
+    Look up the thumbnails of the posts in one cache round trip.
+
+    Only the variants of the crops that are made of each image, none
+    wider than it, are looked up, so that ready() expects no others.
+    Whatever the cache misses is read from the database in one query.
+    The results are kept on each post, where ThumbnailBackend finds
+    them instead of making a lookup per {% thumbnail %} tag.
+    """
+    backend = ThumbnailBackend()
+    names = {}
+    for post in posts:
+        if not post.image:
+            continue
+        source = ImageFile(post.image)
+        for crop in crops:
+            for geometry, options in variants(crop, post.image_width):
+                name = backend.thumbnail_name(source, geometry, options)
+                key = add_prefix(ImageFile(name, default.storage).key)
+                names[key] = (post, name)
+    if not names:
+        return posts
+    for key, value in _get_many_raw(list(names)).items():
+        post, name = names[key]
+        if not hasattr(post, '_thumbnails'):
+            post._thumbnails = {}
+        post._thumbnails[name] = (
+            deserialize_image_file(value) if value is not None else None
+        )
+    return posts
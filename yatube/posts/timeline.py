@@ -0,0 +1,198 @@
+import heapq
+from itertools import islice
+
+from django.conf import settings
+from django.db.models import Q
+
+from .counters import counters_of
+from .models import (Follow, Post, PulledAuthor, TimelineEntry, User,
+                     UserCounters)
+from .paginators import NEXT, CursorPaginator
+
+BATCH_SIZE: int = 1000
+# Pulled authors read by one feed query, each adds a subquery to its OR
+PULLED_CHUNK_SIZE: int = 20
+
+
+def _entries(user_id, posts):
+    return [
+        TimelineEntry(
+            user_id=user_id,
+            post_id=post.id,
+            author_id=post.author_id,
+            pub_date=post.pub_date,
+        )
+        for post in posts
+    ]
+
+
+def is_pulled(author_id):
+    """Tell if the posts of the author are read into feeds at read time."""
+    return PulledAuthor.objects.filter(author_id=author_id).exists()
+
+
+def push_post(post):
+    """Put a new post into the timelines of all author's followers."""
+    if is_pulled(post.author_id):
+        return
+    follower_ids = Follow.objects.filter(
+        author_id=post.author_id
+    ).values_list('user_id', flat=True)
+    TimelineEntry.objects.bulk_create(
+        [
+            entry
+            for follower_id in follower_ids.iterator()
+            for entry in _entries(follower_id, [post])
+        ],
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def backfill(user_id, author_id):
+    """Copy already published posts of a new followed author."""
+    if is_pulled(author_id):
+        return
+    posts = Post.objects.filter(author_id=author_id).only(
+        'id', 'author_id', 'pub_date'
+    )
+    TimelineEntry.objects.bulk_create(
+        _entries(user_id, posts.iterator()),
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def prune(user_id, author_id):
+    """Remove posts of an unfollowed author from the timeline."""
+    TimelineEntry.objects.filter(
+        user_id=user_id,
+        author_id=author_id,
+    ).delete()
+
+
+def update_mode(author_id):
+    """
+    Switch the author to pull once followers exceed FEED_PULL_THRESHOLD.
+
+    Switching back copies every post of the author into the timeline of
+    every follower, too much for an unfollow request, so rebuild does it
+    for authors fallen below half of the threshold. Until then their
+    posts are still pulled into feeds, which only costs a query more.
+    """
+    if is_pulled(author_id):
+        return
+    followers = counters_of(User(pk=author_id)).followers_count
+    if followers > settings.FEED_PULL_THRESHOLD:
+        PulledAuthor.objects.create(author_id=author_id)
+        TimelineEntry.objects.filter(author_id=author_id).delete()
+
+
+def push_again():
+    """
+    Stop pulling authors below half of FEED_PULL_THRESHOLD.
+
+    Return how many; their posts are left for rebuild to copy.
+    """
+    authors = UserCounters.objects.filter(
+        followers_count__lt=settings.FEED_PULL_THRESHOLD // 2
+    ).values('user_id')
+    return PulledAuthor.objects.filter(author_id__in=authors).delete()[0]
+
+
+def rebuild(batch_size=BATCH_SIZE):
+    """
+    Fill all timelines from scratch, return the number of entries.
+
+    Authors pulled with few followers left are pushed again first.
+    """
+    push_again()
+    TimelineEntry.objects.all().delete()
+    created = 0
+    follows = Follow.objects.exclude(
+        author_id__in=PulledAuthor.objects.values('author_id')
+    ).values_list('user_id', 'author_id')
+    for user_id, author_id in follows.iterator(chunk_size=batch_size):
+        posts = Post.objects.filter(author_id=author_id).only(
+            'id', 'author_id', 'pub_date'
+        )
+        entries = _entries(user_id, posts.iterator(chunk_size=batch_size))
+        created += len(
+            TimelineEntry.objects.bulk_create(entries, batch_size=batch_size)
+        )
+    return created
+
+
+class FeedPaginator(CursorPaginator):
+    """
+    Cursor pages of the follow feed.
+
+    Posts of ordinary authors come from the user's timeline, posts of
+    pulled authors are read from each of them and merged in.
+    """
+
+    def __init__(self, user, per_page):
+        entries = user.timeline.select_related('post__author', 'post__group')
+        super().__init__(entries, per_page, tiebreak='post_id')
+        self.pulled_ids = list(
+            PulledAuthor.objects.filter(
+                author__following__user=user
+            ).values_list('author_id', flat=True)
+        )
+
+    def rows(self, value, pk, direction, limit):
+        timeline = [
+            entry.post
+            for entry in self.seek(
+                self.object_list, value, pk, direction, limit
+            )
+        ]
+        merged = heapq.merge(
+            timeline,
+            self.pulled_rows(value, pk, direction, limit),
+            key=self.position,
+            reverse=direction == NEXT,
+        )
+        return list(islice(merged, limit))
+
+    def pulled_rows(self, value, pk, direction, limit):
+        """
+        Up to limit posts of the pulled authors, in the feed's order.
+
+        Every author adds a subquery seeking along its (author,
+        pub_date) index, so no more than limit posts are read per
+        author however many they have written. The subqueries of
+        PULLED_CHUNK_SIZE authors are ORed into one query, the chunks
+        merged here, so that the OR stays within SQLite's expression
+        depth limit.
+        """
+        reverse = direction == NEXT
+        chunks = [
+            sorted(
+                self.pulled_chunk(author_ids, value, pk, direction, limit),
+                key=self.position,
+                reverse=reverse,
+            )[:limit]
+            for author_ids in (
+                self.pulled_ids[start:start + PULLED_CHUNK_SIZE]
+                for start in range(
+                    0, len(self.pulled_ids), PULLED_CHUNK_SIZE
+                )
+            )
+        ]
+        return heapq.merge(*chunks, key=self.position, reverse=reverse)
+
+    def pulled_chunk(self, author_ids, value, pk, direction, limit):
+        pages = Q()
+        for author_id in author_ids:
+            page = self.seeking(
+                Post.objects.filter(author_id=author_id),
+                value, pk, direction, tiebreak='id',
+            )
+            pages |= Q(id__in=page.values('id')[:limit])
+        return Post.objects.filter(pages).select_related(
+            'author', 'group'
+        ).order_by()
+
+    def position(self, post):
+        return post.pub_date, post.id
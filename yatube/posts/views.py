@@ -1,28 +1,94 @@
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator
+from django.db import transaction
 from django.shortcuts import get_object_or_404, redirect, render
-from django.views.decorators.cache import cache_page
+from django.views.decorators.http import require_POST
 
+from core.query_budget import query_budget
+from .caching import (FEED, author_scope, cache_page_versioned,
+                      conditional, group_scope, post_scope)
+from .counters import counters_of
 from .forms import CommentForm, PostForm
 from .models import Group, Post, User, Follow
+from .paginators import CursorPaginator
+from .thumbnails import CARD_CROP, DETAIL_CROP, MEASURED_FIELDS, prefetch
+from .timeline import FeedPaginator
 
 NUMBER_OF_DISPLAYED_ITEMS: int = 10
-TIMEOUT_FOR_CACHE: int = 20
+NUMBER_OF_DISPLAYED_COMMENTS: int = 20
+TIMEOUT_FOR_CACHE: int = 60 * 60 * 6
+HARD_TIMEOUT_FOR_CACHE: int = 60 * 60 * 24
+
+
+def index_scopes(request):
+    return [FEED]
+
+
+def group_scopes(request, slug):
+    return [group_scope(slug)]
+
+
+def profile_scopes(request, username):
+    return [author_scope(username)]
+
+
+def post_detail_scopes(request, post_id):
+    """A post page also shows the counters of its author and its group."""
+    # Asked by both the ETag and the page cache, looked up once
+    if not hasattr(request, '_post_scopes'):
+        username, slug = Post.objects.filter(id=post_id).values_list(
+            'author__username', 'group__slug'
+        ).first() or (None, None)
+        request._post_scopes = [post_scope(post_id), author_scope(username)]
+        if slug is not None:
+            request._post_scopes.append(group_scope(slug))
+    return request._post_scopes
+
+
+def follow_scopes(request):
+    """A feed changes with any of the followed authors, or their set."""
+    return [
+        author_scope(username)
+        for username in request.user.follower.order_by(
+            'author_id'
+        ).values_list('author__username', flat=True)
+    ]
 
 
 def paginator(post_list, request):
-    """Posts pagination."""
-    paginator = Paginator(post_list, NUMBER_OF_DISPLAYED_ITEMS)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    """
+    Posts pagination by an opaque cursor instead of a page number.
+
+    The thumbnails of the page are looked up together, once.
+    """
+    paginator = CursorPaginator(post_list, NUMBER_OF_DISPLAYED_ITEMS)
+    page_obj = paginator.get_page(request.GET.get('cursor'))
+    prefetch(page_obj.object_list, [CARD_CROP])
     return page_obj
 
 
-@cache_page(TIMEOUT_FOR_CACHE, key_prefix='index')
+def comments_paginator(post, request):
+    """Comments pagination by the (created, id) cursor."""
+    paginator = CursorPaginator(
+        post.comments.select_related('author'),
+        NUMBER_OF_DISPLAYED_COMMENTS,
+        key='created',
+    )
+    return paginator.get_page(request.GET.get('cursor'))
+
+
+@conditional(index_scopes)
+@cache_page_versioned(
+    TIMEOUT_FOR_CACHE,
+    key_prefix='index',
+    scopes=index_scopes,
+    hard_timeout=HARD_TIMEOUT_FOR_CACHE,
+    background_refresh=True,
+)
+@query_budget(4)
 def index(request):
     """The main page."""
     page_title = 'This is the main page of yatube project.'
-    post_list = Post.objects.all()
+    post_list = Post.objects.select_related('author', 'group')
     context = {
         'page_title': page_title,
         'page_obj': paginator(post_list, request),
@@ -30,10 +96,19 @@ def index(request):
     return render(request, 'posts/index.html', context)
 
 
+@conditional(group_scopes)
+@cache_page_versioned(
+    TIMEOUT_FOR_CACHE,
+    key_prefix='group',
+    scopes=group_scopes,
+    hard_timeout=HARD_TIMEOUT_FOR_CACHE,
+    background_refresh=True,
+)
+@query_budget(5)
 def group_posts(request, slug):
     """All posts of the certain group."""
     group = get_object_or_404(Group, slug=slug)
-    post_list = group.posts.all()
+    post_list = group.posts.select_related('author', 'group')
     context = {
         'group': group,
         'page_obj': paginator(post_list, request),
@@ -41,43 +116,82 @@ def group_posts(request, slug):
     return render(request, 'posts/group_list.html', context)
 
 
+@conditional(profile_scopes)
+@cache_page_versioned(
+    TIMEOUT_FOR_CACHE,
+    key_prefix='profile',
+    scopes=profile_scopes,
+)
+@query_budget(6)
 def profile(request, username):
     """Profile page."""
-    author = get_object_or_404(User, username=username)
-    post_list = author.posts.select_related('author')
-    following = author.following.filter(user__id=request.user.id).exists()
+    author = get_object_or_404(
+        User.objects.select_related('counters'),
+        username=username
+    )
+    post_list = author.posts.select_related('author', 'group')
+    counters = counters_of(author)
     context = {
-        'request': request,
         'author': author,
         'page_obj': paginator(post_list, request),
-        'count': author.posts.count(),
-        'following': following
+        'count': counters.posts_count,
+        'counters': counters,
     }
     return render(request, 'posts/profile.html', context)
 
+
+@login_required(login_url='users:login')
+@require_POST
+@transaction.atomic
+@query_budget(14)
 def post_delete(request, post_id):
     """Delete certain post."""
     post = get_object_or_404(Post, id=post_id)
-    post_author = post.author.username
-    if request.user != post_author:
+    if request.user != post.author:
         return redirect('posts:profile', post.author.username)
     else:
         post.delete()
         return redirect('posts:profile', request.user)
 
 
+@conditional(post_detail_scopes)
+@cache_page_versioned(
+    TIMEOUT_FOR_CACHE,
+    key_prefix='post',
+    scopes=post_detail_scopes,
+)
+@query_budget(5)
 def post_detail(request, post_id):
     """View a certain post."""
-    post = get_object_or_404(Post, id=post_id)
+    post = get_object_or_404(
+        Post.objects.select_related('author__counters', 'group'),
+        id=post_id
+    )
+    prefetch([post], [DETAIL_CROP])
     form = CommentForm()
     context = {
         'post': post,
         'form': form,
+        'author_counters': counters_of(post.author),
+        'comments_page': comments_paginator(post, request),
     }
     return render(request, 'posts/post_detail.html', context)
 
 
+@query_budget(2)
+def post_comments(request, post_id):
+    """The next batch of comments of a post as an HTML fragment."""
+    post = get_object_or_404(Post.objects.only('id'), id=post_id)
+    context = {
+        'post': post,
+        'comments_page': comments_paginator(post, request),
+    }
+    return render(request, 'includes/comment_list.html', context)
+
+
 @login_required(login_url='users:login')
+@transaction.atomic
+@query_budget(14)
 def post_create(request):
     """Post creation."""
     template = 'posts/create_post.html'
@@ -94,6 +208,8 @@ def post_create(request):
 
 
 @login_required(login_url='users:login')
+@transaction.atomic
+@query_budget(13)
 def post_edit(request, post_id):
     """Post editing."""
     template = 'posts/create_post.html'
@@ -106,7 +222,11 @@ def post_edit(request, post_id):
         instance=post,
     )
     if form.is_valid():
-        form.save()
+        # Counters are kept by F-expressions, so only the form fields
+        # and what is measured from the image are written back.
+        form.save(commit=False).save(
+            update_fields=PostForm._meta.fields + MEASURED_FIELDS
+        )
         return redirect('posts:post_detail', post_id)
     return render(
         request,
@@ -116,6 +236,8 @@ def post_edit(request, post_id):
 
 
 @login_required(login_url='users:login')
+@transaction.atomic
+@query_budget(4)
 def add_comment(request, post_id):
     """To add a comment to a certain post."""
     post = get_object_or_404(Post, id=post_id)
@@ -129,17 +251,23 @@ def add_comment(request, post_id):
 
 
 @login_required(login_url='users:login')
+@conditional(follow_scopes)
+@query_budget(3)
 def follow_index(request):
-    """The page of subscriptions."""
-    post_list = Post.objects.filter(author__following__user=request.user)
+    """The page of subscriptions read from the user's timeline."""
+    feed = FeedPaginator(request.user, NUMBER_OF_DISPLAYED_ITEMS)
+    page_obj = feed.get_page(request.GET.get('cursor'))
+    prefetch(page_obj.object_list, [CARD_CROP])
     template = 'posts/follow.html'
     context = {
-        'page_obj': paginator(post_list, request),
+        'page_obj': page_obj,
     }
     return render(request, template, context)
 
 
 @login_required(login_url='users:login')
+@transaction.atomic
+@query_budget(14)
 def profile_follow(request, username):
     """To subscribe to your favorite author."""
     author = get_object_or_404(User, username=username)
@@ -149,6 +277,8 @@ def profile_follow(request, username):
 
 
 @login_required(login_url='users:login')
+@transaction.atomic
+@query_budget(14)
 def profile_unfollow(request, username):
     """Unsubscribe of author."""
     Follow.objects.filter(
@@ -53,6 +53,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'core.compression.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -137,10 +138,19 @@ USE_TZ = True
 # Указываем путь до дериктории, где будут храниться фото
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+# Кто отдает байты медиафайлов, см. core.media: None — сам Django,
+# 'x-sendfile' — Apache или lighttpd, 'x-accel-redirect' — nginx
+# из internal location MEDIA_ACCEL_PREFIX
+MEDIA_SENDFILE = None
+MEDIA_ACCEL_PREFIX = '/protected-media/'
 
 # Указываем путь до статики, для подгрузки в html-шаблоны
 STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]
 STATIC_URL = '/static/'
+# collectstatic кладет сюда файлы с хешем содержимого в имени и их
+# сжатые копии, см. core.staticfiles
+STATIC_ROOT = os.path.join(BASE_DIR, 'collected_static')
+STATICFILES_STORAGE = 'core.staticfiles.CompressedManifestStaticFilesStorage'
 
 
 # Emails sent and store
@@ -150,8 +160,35 @@ EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 
 # Подключение кэширования
+# Кеш общий для всех процессов-воркеров: файл SQLite в режиме WAL
+# с вытеснением давно не читанных записей по превышении MAX_BYTES
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'core.cache.SQLiteCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache.sqlite3'),
+        'OPTIONS': {
+            'MAX_BYTES': 64 * 1024 * 1024,
+        },
     }
 }
+
+# Тесты пишут в свой временный файл кеша, а не в cache.sqlite3
+TEST_RUNNER = 'yatube.test_runner.TemporaryCacheRunner'
+
+# Авторы, у которых подписчиков больше порога, не раскладывают посты
+# по лентам подписчиков: их посты подмешиваются в ленту при чтении
+FEED_PULL_THRESHOLD = 10000
+
+# Превышение бюджета SQL-запросов вьюхи вызывает исключение, а не запись в лог
+QUERY_BUDGET_STRICT = False
+
+# Миниатюры не создаются при рендеринге шаблона: их готовит пул потоков
+# сразу после сохранения картинки, см. posts.thumbnails
+THUMBNAIL_BACKEND = 'posts.thumbnails.ThumbnailBackend'
+
+# Загрузки пишутся во временный файл по частям, а не держатся в памяти;
+# файлы больше UPLOAD_MAX_SIZE форма отклоняет, не декодируя
+FILE_UPLOAD_HANDLERS = [
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+]
+UPLOAD_MAX_SIZE = 20 * 1024 * 1024
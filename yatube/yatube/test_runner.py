@@ -0,0 +1,39 @@
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.test import override_settings
+from django.test.runner import DiscoverRunner
+
+
+@contextmanager
+def temporary_cache():
+    """
+    Point the default cache at a file of its own, removed on exit.
+
+    Tests and benchmarks would otherwise fill and clear the developer's
+    cache file.
+    """
+    directory = tempfile.mkdtemp()
+    cache = dict(settings.CACHES['default'])
+    cache['LOCATION'] = os.path.join(directory, 'cache.sqlite3')
+    try:
+        with override_settings(CACHES={**settings.CACHES, 'default': cache}):
+            yield
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+class TemporaryCacheRunner(DiscoverRunner):
+    """Test runner giving the test run a cache file of its own."""
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._temporary_cache = temporary_cache()
+        self._temporary_cache.__enter__()
+
+    def teardown_test_environment(self, **kwargs):
+        self._temporary_cache.__exit__(None, None, None)
+        super().teardown_test_environment(**kwargs)